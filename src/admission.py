@@ -0,0 +1,156 @@
+import asyncio, os, time
+from collections import OrderedDict
+from typing import Dict
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from fastmcp.exceptions import ToolError
+from fastmcp.server.dependencies import get_http_request
+from fastmcp.server.middleware import Middleware
+
+# Control de admision para los servidores MCP por HTTP/SSE (mcp_f1_http, mcp_trivial_http).
+# 1) Opcional (LIMIT_RATE>0): token bucket por cliente y carril, LIMIT_RATE peticiones/s
+#    sostenidas y rafagas de hasta LIMIT_BURST. Cliente = cabecera LIMIT_CLIENT_HEADER (por
+#    defecto X-Client-Id) o, si falta, la IP: detras de un proxy o NAT todos comparten bucket.
+# 2) Carriles: las herramientas baratas (LIMIT_FAST_TOOLS) tienen su propio limite de
+#    concurrencia y nunca esperan detras de las caras. El resto comparte LIMIT_CONCURRENCY
+#    slots con una cola acotada (LIMIT_QUEUE, espera maxima LIMIT_QUEUE_TIMEOUT_S).
+# Los rechazos son errores de herramienta "rate limited: ..." u "overloaded: ..." (el mismo
+# contrato que la cola del solver en mcp_f1_server).
+# /health es una ruta HTTP, no una herramienta: no pasa por aqui. GET /limits expone el estado.
+# Con WORKERS>1 cada proceso tiene su propio limitador.
+
+ENABLED = os.getenv("ADMISSION", "1").lower() in ("1", "true", "yes")
+RATE = float(os.getenv("LIMIT_RATE", "0"))                  # 0 = sin limite por cliente (opt-in)
+BURST = float(os.getenv("LIMIT_BURST", "20"))
+CLIENT_HEADER = os.getenv("LIMIT_CLIENT_HEADER", "x-client-id").lower()
+MAX_CLIENTS = int(os.getenv("LIMIT_MAX_CLIENTS", "10000"))  # buckets en memoria (LRU)
+CONCURRENCY = int(os.getenv("LIMIT_CONCURRENCY", "8"))
+QUEUE = int(os.getenv("LIMIT_QUEUE", "32"))
+QUEUE_TIMEOUT_S = float(os.getenv("LIMIT_QUEUE_TIMEOUT_S", "10"))
+FAST_TOOLS = {t.strip() for t in os.getenv(
+    "LIMIT_FAST_TOOLS", "ping,echo,time_now,get_race,get_calendar").split(",") if t.strip()}
+FAST_CONCURRENCY = int(os.getenv("LIMIT_FAST_CONCURRENCY", "64"))
+
+
+class Lane:
+    def __init__(self, name: str, limit: int, queue: int, timeout_s: float):
+        self.name, self.limit, self.queue, self.timeout_s = name, limit, queue, timeout_s
+        self._sem = asyncio.Semaphore(limit)
+        self.inflight = self.waiting = 0
+        self.admitted = self.rejected_queue_full = self.rejected_timeout = 0
+        self.wait_s_total = 0.0
+
+    async def acquire(self):
+        # slot libre: entra sin esperar; si no, a la cola (si cabe) con espera acotada
+        if not self._sem.locked() and not self.waiting:
+            await self._sem.acquire()           # no suspende: hay slot
+            self.inflight += 1
+            self.admitted += 1
+            return
+        if self.waiting >= self.queue:
+            self.rejected_queue_full += 1
+            raise ToolError(f"overloaded: {self.name} queue full")
+        t0 = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.timeout_s)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            raise ToolError(f"overloaded: waited {self.timeout_s}s for a {self.name} slot")
+        finally:
+            self.waiting -= 1
+        self.wait_s_total += time.monotonic() - t0
+        self.inflight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.inflight -= 1
+        self._sem.release()
+
+    def state(self) -> Dict:
+        return {"limit": self.limit, "inflight": self.inflight, "waiting": self.waiting,
+                "queue": self.queue, "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "avg_wait_ms": round(1000.0 * self.wait_s_total / self.admitted, 3) if self.admitted else 0.0}
+
+
+class AdmissionControl(Middleware):
+    def __init__(self):
+        self.lanes = {"fast": Lane("fast", FAST_CONCURRENCY, QUEUE, QUEUE_TIMEOUT_S),
+                      "heavy": Lane("heavy", CONCURRENCY, QUEUE, QUEUE_TIMEOUT_S)}
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()     # cliente/carril -> [tokens, t, limitadas]
+        self.rate_limited = 0
+
+    @staticmethod
+    def _client_id() -> str:
+        try:
+            req = get_http_request()
+        except RuntimeError:
+            return "local"                  # stdio / en memoria
+        cid = req.headers.get(CLIENT_HEADER)
+        if cid:
+            return cid[:128]
+        return req.client.host if req.client else "unknown"
+
+    def _take(self, client: str) -> float:
+        # 0 si hay token; si no, segundos hasta el siguiente
+        now = time.monotonic()
+        b = self._buckets.get(client)
+        if b is None:
+            b = self._buckets[client] = [BURST, now, 0]
+            if len(self._buckets) > MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            b[0] = min(BURST, b[0] + (now - b[1]) * RATE)
+            b[1] = now
+        if b[0] >= 1.0:
+            b[0] -= 1.0
+            return 0.0
+        b[2] += 1
+        return (1.0 - b[0]) / RATE
+
+    async def on_call_tool(self, context, call_next):
+        name = "fast" if context.message.name in FAST_TOOLS else "heavy"
+        if RATE > 0:
+            # un bucket por cliente y carril: las llamadas caras no gastan los tokens de las baratas
+            client = self._client_id()
+            retry = self._take(f"{client}/{name}")
+            if retry:
+                self.rate_limited += 1
+                raise ToolError(f"rate limited: client {client}, retry in {retry:.2f}s")
+        lane = self.lanes[name]
+        await lane.acquire()
+        try:
+            return await call_next(context)
+        finally:
+            lane.release()
+
+    def state(self) -> Dict:
+        now = time.monotonic()
+        clients = {c: {"tokens": round(min(BURST, b[0] + (now - b[1]) * RATE), 2), "limited": b[2]}
+                   for c, b in self._buckets.items()}
+        top = sorted(clients.items(), key=lambda kv: (kv[1]["tokens"], -kv[1]["limited"]))[:20]
+        return {
+            "config": {"rate": RATE, "burst": BURST, "client_header": CLIENT_HEADER,
+                       "fast_tools": sorted(FAST_TOOLS), "queue_timeout_s": QUEUE_TIMEOUT_S},
+            "lanes": {n: l.state() for n, l in self.lanes.items()},
+            "rate_limited": self.rate_limited,
+            "clients": len(self._buckets),
+            "busiest_clients": dict(top),
+        }
+
+
+def install(mcp) -> AdmissionControl | None:
+    # middleware + GET /limits; no-op con ADMISSION=0
+    if not ENABLED:
+        return None
+    ac = AdmissionControl()
+    mcp.add_middleware(ac)
+
+    @mcp.custom_route("/limits", methods=["GET"])
+    async def limits(_req: Request) -> JSONResponse:
+        return JSONResponse(ac.state())
+
+    return ac
@@ -3,26 +3,21 @@ from dotenv import load_dotenv
 from typing import List, Dict
 from anthropic import Anthropic
 from .log import jdump
+from .race_catalog import CATALOG
+from .degradation_fit import fitted_params
 
 import asyncio, json
 import sys
 import re
 from contextlib import AsyncExitStack
 from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
-from mcp.client.sse import sse_client
+from .mcp_peers import build_transport, content_data, content_text, f1_server_config, load_peers, open_session
+from .peer_http import POOL as HTTP_POOL
+from .tool_bridge import BRIDGE
 
 LAST_RACE_ID = None              
 LAST_PLAN_ARGS = None
 
-RACE_ALIASES = {
-    "monza": "demo_monza_2024",
-    "italia": "demo_monza_2024",
-    "mexico": "demo_mexico_2024",
-    "ciudad de mexico": "demo_mexico_2024",
-    "cdmx": "demo_mexico_2024",
-}
-
 DEFAULT_PLAN = {
     "base_laptime_s": 80.0,
     "deg_soft_s": 0.12,
@@ -33,32 +28,12 @@ DEFAULT_PLAN = {
     "max_stops": 2,
 }
 
-PRESETS = {
-    "demo_monza_2024": {
-        "base_laptime_s": 79.8,
-        "deg_soft_s": 0.13,
-        "deg_medium_s": 0.09,
-        "deg_hard_s": 0.06,
-        "min_stint_laps": 9,
-        "max_stint_laps": 28,
-        "max_stops": 2,
-    },
-    "demo_mexico_2024": {
-        "base_laptime_s": 80.0,
-        "deg_soft_s": 0.12,
-        "deg_medium_s": 0.08,
-        "deg_hard_s": 0.05,
-        "min_stint_laps": 10,
-        "max_stint_laps": 30,
-        "max_stops": 2,
-    },
-}
-
 def _merge_params(race_id: str, overrides: dict) -> dict:
-    # orden: default -> preset pista -> overrides del usuario
+    # orden: default -> preset pista -> ajuste cacheado (fit_degradation) -> overrides del usuario
+    # los presets por circuito vienen del mismo catalogo que usa el servidor
     out = DEFAULT_PLAN.copy()
-    if race_id in PRESETS:
-        out.update(PRESETS[race_id])
+    out.update(CATALOG.preset(race_id))
+    out.update(fitted_params(race_id))
     for k, v in overrides.items():
         if v is not None:
             out[k] = v
@@ -149,42 +124,16 @@ load_dotenv()
 server = StdioServerParameters(command=sys.executable, args=["-m", "src.mcp_f1_server"])
 
 API_KEY = os.getenv("ANTHROPIC_API_KEY")
-if not API_KEY:
-    print("ERROR: Falta ANTHROPIC_API_KEY en .env"); sys.exit(1)
 MODEL = os.getenv("ANTHROPIC_MODEL", "claude-3-sonnet-20240229")
 
-client = Anthropic(api_key=API_KEY)
+# sin API key el modulo sigue siendo importable (p.ej. replay); run_chat la exige
+client = Anthropic(api_key=API_KEY) if API_KEY else None
 
 
-def _mcp_text(resp):
-    parts = getattr(resp, "content", []) or []
-    out = []
-    for p in parts:
-        if isinstance(p, dict) and p.get("type") == "text":
-            out.append(p.get("text", ""))
-        elif getattr(p, "type", None) == "text":
-            out.append(getattr(p, "text", ""))
-    return "\n".join(out).strip()
-
-def _load_peers():
-    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "peers.json")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-    
-def _build_transport(cfg: dict):
-    
-    t = (cfg.get("type") or "stdio").lower()
-    if t == "stdio":
-        command = cfg["command"]
-        args = cfg.get("args", [])
-        cwd = cfg.get("cwd")
-        return ("stdio", StdioServerParameters(command=command, args=args, cwd=cwd))
-    if t == "sse":
-        url = cfg.get("url")
-        if not url:
-            raise ValueError("Peer 'sse' requiere 'url'")
-        return ("sse", url)
-    raise ValueError(f"Tipo de peer no soportado: {t}")
+_mcp_text = content_text
+_mcp_data = content_data
+_load_peers = load_peers
+_build_transport = build_transport
 
 
 def peer_call(alias: str, tool: str | None, args: dict | None) -> str:
@@ -196,13 +145,9 @@ def peer_call(alias: str, tool: str | None, args: dict | None) -> str:
 
     async def _run():
         async with AsyncExitStack() as stack:
-            if kind == "stdio":
-                read, write = await stack.enter_async_context(stdio_client(param))
-            else:  # kind == "sse"
-                read, write = await stack.enter_async_context(sse_client(url=param))
-
-            session = await stack.enter_async_context(ClientSession(read, write))
-            await session.initialize()
+            # http: conexiones keep-alive del pool compartido (sin handshake nuevo por llamada)
+            session = await open_session(stack, kind, param,
+                                         HTTP_POOL.factory(param) if kind == "http" else None)
 
             if not tool:
                 tools = await session.list_tools()
@@ -211,6 +156,8 @@ def peer_call(alias: str, tool: str | None, args: dict | None) -> str:
             resp = await session.call_tool(tool, args or {})
             return _mcp_text(resp)
 
+    if kind == "http":
+        return HTTP_POOL.run(_run())
     return asyncio.run(_run())
 
 
@@ -276,13 +223,13 @@ def try_nl_command(user_text: str) -> str | None:
     if re.search(r"\b(estrategia|plan|stint(s)?|paradas|pit\s*stops?)\b", t):
         
         race_id = None
-        m = re.search(r"(demo_[a-z0-9_\-]+_2024)", t)
-        if m:
+        m = re.search(r"\b([a-z0-9_\-]+_\d{4})\b", t)
+        if m and CATALOG.get(m.group(1)):
             race_id = m.group(1)
         else:
-            for alias, rid in RACE_ALIASES.items():
+            for alias in CATALOG.aliases():
                 if alias in t:
-                    race_id = rid
+                    race_id = CATALOG.resolve_alias(alias)
                     break
         global LAST_RACE_ID
         if not race_id and LAST_RACE_ID:
@@ -318,20 +265,15 @@ def try_nl_command(user_text: str) -> str | None:
         used = _merge_params(race_id, overrides)
 
         
-        out = f1_call("recommend_strategy", {"race_id": race_id, **used})
+        d = f1_call("recommend_strategy", {"race_id": race_id, **used}, structured=True)
         
         global LAST_PLAN_ARGS
         LAST_RACE_ID = race_id
         LAST_PLAN_ARGS = {"race_id": race_id, **used}
 
-        
-        try:
-            d = json.loads(out)
-            if isinstance(d, dict) and d.get("ok"):
-                return _format_strategy_txt(d, used)
-        except Exception:
-            pass
-        return out
+        if isinstance(d, dict) and d.get("ok"):
+            return _format_strategy_txt(d, used)
+        return d if isinstance(d, str) else json.dumps(d, ensure_ascii=False)
       
     if re.search(r"\b(explica|explicame|como calculaste|de donde salen|parametros)\b", t) and LAST_RACE_ID:
         return explain_last_plan()
@@ -340,24 +282,61 @@ def try_nl_command(user_text: str) -> str | None:
 
 
 
+def dispatch(user: str) -> str | None:
+    # /peer, /f1 y comandos en lenguaje natural; None = se manda al LLM
+    if user.startswith("/peer"):
+        return handle_peer_cmd(user)
+    if user.startswith("/f1"):
+        return handle_f1_command(user)
+    return try_nl_command(user)
+
+# LLM_TOOLS=1: el modelo puede llamar a las herramientas F1 (y de LLM_TOOL_PEERS) por tool use
+LLM_TOOLS = os.getenv("LLM_TOOLS", "1").lower() in ("1", "true", "yes")
+LLM_TOOL_ROUNDS = int(os.getenv("LLM_TOOL_ROUNDS", "4"))
+
+def llm_turn(history: List[Dict]) -> str:
+    # Las rondas de tool_use/tool_result viven solo en 'turn': al historial va la respuesta
+    # final en texto, asi el recorte de push() nunca separa un tool_use de su resultado.
+    tools = []
+    if LLM_TOOLS:
+        try:
+            tools = BRIDGE.tools()
+        except Exception as e:
+            jdump({"type": "tool_bridge_error", "error": str(e)})
+    kw = {"tools": tools} if tools else {}
+    turn = list(history)
+    msg = client.messages.create(model=MODEL, max_tokens=400, messages=turn, **kw)
+    for _ in range(LLM_TOOL_ROUNDS):
+        uses = [b for b in msg.content if b.type == "tool_use"]
+        if msg.stop_reason != "tool_use" or not uses:
+            break
+        turn.append({"role": "assistant", "content": [
+            {"type": "text", "text": b.text} if b.type == "text" else
+            {"type": "tool_use", "id": b.id, "name": b.name, "input": b.input}
+            for b in msg.content if b.type in ("text", "tool_use")]})
+        # todas las herramientas del turno en paralelo y un solo request de vuelta
+        turn.append({"role": "user", "content": BRIDGE.call_many([(b.id, b.name, b.input) for b in uses])})
+        msg = client.messages.create(model=MODEL, max_tokens=400, messages=turn, **kw)
+    text = "".join(b.text for b in msg.content if b.type == "text").strip()
+    if msg.stop_reason == "tool_use":
+        # el modelo sigue pidiendo herramientas: se corta aqui y se dice por que
+        note = f"[limite de {LLM_TOOL_ROUNDS} rondas de herramientas alcanzado; respuesta incompleta]"
+        return f"{text}\n{note}" if text else note
+    return text or "[el modelo no devolvio texto]"
+
 def run_chat():
+    if client is None:
+        print("ERROR: Falta ANTHROPIC_API_KEY en .env"); sys.exit(1)
     history: List[Dict[str, str]] = []
     print("Chat MCP-Proy1 (escribe 'exit' para salir)")
     while True:
         try:
             user = input("> ")
-            if user.startswith("/peer"):
-                out = handle_peer_cmd(user)
-                print(out)
-                continue
-            if user.startswith("/f1"):
-                out = handle_f1_command(user)
-                print(out)
-                continue
-            routed = try_nl_command(user)
+            routed = dispatch(user)
             if routed is not None:
                 print(routed)
-                jdump({"type": "nl_dispatch", "input": sanitize(user), "output": sanitize(routed)})
+                kind = "cmd_dispatch" if user.startswith("/") else "nl_dispatch"
+                jdump({"type": kind, "input": sanitize(user), "output": sanitize(routed)})
                 continue
         except EOFError:
             break
@@ -370,13 +349,7 @@ def run_chat():
         push(history, "user", user)
 
         try:
-            msg = client.messages.create(
-                model=MODEL,
-                max_tokens=400,
-                messages=history
-            )
-            reply = msg.content[0].text if msg.content else ""
-            reply = sanitize(reply)
+            reply = sanitize(llm_turn(history))
             print(reply)
             jdump({"type": "llm_exchange", "request": sanitize(user), "response": reply})
             push(history, "assistant", reply)
@@ -385,15 +358,23 @@ def run_chat():
             jdump({"type": "llm_error", "request": sanitize(user), "error": str(e)})
           
             continue
+    BRIDGE.close()
+
 
+# F1_TRANSPORT=inprocess monta el FastMCP de src.mcp_f1_server en este proceso:
+# mismas herramientas, sin subproceso ni serializacion por pipes. Por defecto, stdio.
+F1_TRANSPORT = os.getenv("F1_TRANSPORT", "stdio").lower()
 
-def f1_call(tool: str, args: dict) -> str:
+async def _f1_session(stack: AsyncExitStack) -> ClientSession:
+    # misma configuracion que el puente de herramientas (en proceso: pool de hilos)
+    kind, param = build_transport(f1_server_config(F1_TRANSPORT))
+    return await open_session(stack, kind, param)
+
+def f1_call(tool: str, args: dict, structured: bool = False):
+    # structured=True devuelve el payload estructurado (dict) en lugar del texto
     async def _run():
-        server = StdioServerParameters(command="python3", args=["-m", "src.mcp_f1_server"])
         async with AsyncExitStack() as stack:
-            read, write = await stack.enter_async_context(stdio_client(server))
-            session = await stack.enter_async_context(ClientSession(read, write))
-            await session.initialize()
+            session = await _f1_session(stack)
             if tool == "__list__":
                 tools = await session.list_tools()
                 return "TOOLS: " + ", ".join(t.name for t in tools.tools)
@@ -401,7 +382,7 @@ def f1_call(tool: str, args: dict) -> str:
                 global LAST_RACE_ID
                 LAST_RACE_ID = args["race_id"]
             resp = await session.call_tool(tool, args)
-            return _mcp_text(resp)
+            return _mcp_data(resp) if structured else _mcp_text(resp)
     return asyncio.run(_run())
 
 
@@ -467,9 +448,10 @@ def handle_f1_command(line: str) -> str:
     # /f1 calendar 2024
     # /f1 race demo_mexico_2024
     # /f1 plan demo_mexico_2024 80 0.12 0.08 0.05 10 30 2
+    # /f1 sens demo_mexico_2024 80 0.12 0.08 0.05 10 30 2
     parts = line.strip().split()
     if len(parts) < 2:
-        return "Uso: /f1 [tools|calendar|race|plan] ..."
+        return "Uso: /f1 [tools|calendar|race|plan|sens] ..."
 
     cmd = parts[1].lower()
     if cmd == "tools":
@@ -480,9 +462,9 @@ def handle_f1_command(line: str) -> str:
     if cmd == "race":
         if len(parts) != 3: return "Uso: /f1 race <race_id>"
         return f1_call("get_race", {"race_id": parts[2]})
-    if cmd == "plan":
+    if cmd in ("plan", "sens"):
         if len(parts) != 10:
-            return "Uso: /f1 plan <race_id> <base> <degS> <degM> <degH> <minStint> <maxStint> <maxStops>"
+            return f"Uso: /f1 {cmd} <race_id> <base> <degS> <degM> <degH> <minStint> <maxStint> <maxStops>"
         _, _, race_id, base, dS, dM, dH, minL, maxL, maxStops = parts
         args = {
             "race_id": race_id,
@@ -494,6 +476,8 @@ def handle_f1_command(line: str) -> str:
             "max_stint_laps": int(maxL),
             "max_stops": int(maxStops),
         }
+        if cmd == "sens":
+            return f1_call("analyze_sensitivity", args)
         return f1_call("recommend_strategy", args)
 
     return "Comando /f1 desconocido."
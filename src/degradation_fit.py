@@ -0,0 +1,191 @@
+import argparse, csv, json, os
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+# Ajuste de degradacion por compuesto a partir de vueltas reales.
+# CSV con cabecera; columnas (se aceptan alias):
+#   lap, compound, tyre_age, lap_time (segundos o m:ss.sss), fuel
+#   opcionales: driver, pit_in, pit_out (1/0)
+# Modelo, igual que el solver: vuelta = base_c + deg_c * edad + k_fuel * combustible
+# (base_c por compuesto, k_fuel compartido). Se descartan in/out laps y outliers.
+
+FIT_DIR = Path(os.getenv("F1_FIT_DIR", "fits"))
+COMPOUNDS = ("SOFT", "MEDIUM", "HARD")
+COLUMNS = {
+    "lap": ("lap", "lap_number"),
+    "compound": ("compound", "tyre", "tire"),
+    "tyre_age": ("tyre_age", "tire_age", "tyre_life", "tyrelife"),
+    "lap_time": ("lap_time", "lap_time_s", "laptime"),
+    "fuel": ("fuel", "fuel_kg", "fuel_load"),
+    "driver": ("driver", "driver_id", "car"),
+    "pit_in": ("pit_in", "in_lap"),
+    "pit_out": ("pit_out", "out_lap"),
+}
+
+
+def _lap_seconds(s: str) -> float:
+    if ":" in s:
+        m, sec = s.split(":", 1)
+        return int(m) * 60 + float(sec)
+    return float(s)
+
+
+def _resolve(header: Iterable[str]) -> Dict[str, str]:
+    cols = {h.strip().lower(): h for h in header}
+    out = {}
+    for key, names in COLUMNS.items():
+        for n in names:
+            if n in cols:
+                out[key] = cols[n]
+                break
+    missing = [k for k in ("compound", "tyre_age", "lap_time") if k not in out]
+    if missing:
+        raise ValueError(f"CSV sin columnas requeridas: {missing}")
+    return out
+
+
+def load_laps(paths: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Lee los CSV fila a fila a arrays compactos; marca in/out laps por cambios de stint."""
+    comp, age, t, fuel, keep = array("b"), array("d"), array("d"), array("d"), array("b")
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rd = csv.DictReader(f)
+            col = _resolve(rd.fieldnames or [])
+            # ultimo (compuesto, edad, fila) de cada piloto: las filas pueden venir ordenadas
+            # por vuelta con los pilotos intercalados
+            last: Dict[str, tuple] = {}
+            for row in rd:
+                drv = row[col["driver"]] if "driver" in col else ""
+                c = row[col["compound"]].strip().upper()
+                try:
+                    ci = COMPOUNDS.index(c)
+                    a = float(row[col["tyre_age"]])
+                    lt = _lap_seconds(row[col["lap_time"]].strip())
+                    fu = float(row[col["fuel"]] or 0) if "fuel" in col else 0.0
+                except (ValueError, KeyError):
+                    last.pop(drv, None)
+                    continue
+                ok = 1
+                if "pit_in" in col and row[col["pit_in"]].strip() in ("1", "true", "True"):
+                    ok = 0
+                if "pit_out" in col and row[col["pit_out"]].strip() in ("1", "true", "True"):
+                    ok = 0
+                # nuevo stint: cambia el compuesto o la edad no crece -> out lap aqui, in lap antes
+                prev = last.get(drv)
+                if prev is None or prev[0] != ci or a <= prev[1]:
+                    ok = 0
+                    if prev is not None:
+                        keep[prev[2]] = 0
+                last[drv] = (ci, a, len(keep))
+                comp.append(ci); age.append(a); t.append(lt); fuel.append(fu); keep.append(ok)
+    return {
+        "compound": np.frombuffer(comp, dtype=np.int8),
+        "tyre_age": np.frombuffer(age, dtype=np.float64),
+        "lap_time": np.frombuffer(t, dtype=np.float64),
+        "fuel": np.frombuffer(fuel, dtype=np.float64),
+        "keep": np.frombuffer(keep, dtype=np.int8).astype(bool),
+    }
+
+
+def _design(comp: np.ndarray, age: np.ndarray, fuel: np.ndarray, present: list, with_fuel: bool) -> np.ndarray:
+    # [1 por compuesto | edad por compuesto | combustible]
+    onehot = [(comp == i).astype(np.float64) for i in present]
+    cols = onehot + [oh * age for oh in onehot] + ([fuel] if with_fuel else [])
+    return np.column_stack(cols)
+
+
+def fit_degradation(laps: Dict[str, np.ndarray], outlier_mad: float = 3.0,
+                    slow_lap_ratio: float = 1.07) -> Dict:
+    comp, age, t, fuel = laps["compound"], laps["tyre_age"], laps["lap_time"], laps["fuel"]
+    mask = laps["keep"].copy()
+    # vueltas lentas (SC, trafico, errores): fuera las que superan el 107% de la mediana
+    if mask.any():
+        mask &= t <= slow_lap_ratio * np.median(t[mask])
+    for rnd in range(3):
+        # ajuste y, hasta dos veces, filtro de residuos a mas de outlier_mad * MAD y reajuste.
+        # El ultimo ajuste es siempre sobre la mascara final: coef, laps_used, fuel_ref y las
+        # vueltas por compuesto salen de las mismas vueltas
+        present = [i for i in range(len(COMPOUNDS)) if np.count_nonzero(mask & (comp == i)) >= 3]
+        if not present:
+            return {"ok": False, "error": "not enough clean laps to fit"}
+        mask &= np.isin(comp, present)
+        with_fuel = bool(np.ptp(fuel[mask]) > 0)
+        X = _design(comp, age, fuel, present, with_fuel)
+        coef, *_ = np.linalg.lstsq(X[mask], t[mask], rcond=None)
+        if rnd == 2:
+            break
+        resid = t - X @ coef
+        mad = 1.4826 * np.median(np.abs(resid[mask] - np.median(resid[mask])))
+        if mad <= 0:
+            break
+        kept = mask & (np.abs(resid) <= outlier_mad * mad)
+        if np.array_equal(kept, mask):
+            break
+        mask = kept
+
+    k = len(present)
+    base = dict(zip((COMPOUNDS[i] for i in present), coef[:k]))
+    deg = dict(zip((COMPOUNDS[i] for i in present), coef[k:2 * k]))
+    fuel_coef = float(coef[-1]) if with_fuel else 0.0
+    fuel_ref = float(np.mean(fuel[mask])) if with_fuel else 0.0
+    out = {
+        "ok": True,
+        "laps_total": int(t.size),
+        "laps_used": int(np.count_nonzero(mask)),
+        "compounds": {c: {"base_s": round(float(base[c] + fuel_coef * fuel_ref), 4),
+                          "deg_s": round(float(deg[c]), 5),
+                          "laps": int(np.count_nonzero(mask & (comp == COMPOUNDS.index(c))))}
+                      for c in base},
+        "fuel_s_per_unit": round(fuel_coef, 5),
+        "fuel_ref": round(fuel_ref, 3),
+    }
+    # el solver usa un base_laptime_s unico: el del compuesto mas rapido, a combustible medio.
+    # Una degradacion negativa (mejora de pista, ruido) se pasa al solver como 0 y se avisa.
+    out["recommend_args"] = {
+        "base_laptime_s": min(v["base_s"] for v in out["compounds"].values()),
+        **{f"deg_{c.lower()}_s": max(0.0, v["deg_s"]) for c, v in out["compounds"].items()},
+    }
+    clamped = [c for c, v in out["compounds"].items() if v["deg_s"] < 0]
+    if clamped:
+        out["deg_clamped"] = clamped
+    return out
+
+
+def fit_files(paths: Iterable[str], race_id: str | None = None, outlier_mad: float = 3.0) -> Dict:
+    res = fit_degradation(load_laps(paths), outlier_mad=outlier_mad)
+    if race_id and res["ok"]:
+        res["race_id"] = race_id
+        save_fit(race_id, res)
+    return res
+
+
+# ----- Cache por carrera -----
+def save_fit(race_id: str, fit: Dict, directory: Path = FIT_DIR):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f"{race_id}.json").write_text(json.dumps(fit, ensure_ascii=False), encoding="utf-8")
+
+
+def load_fit(race_id: str, directory: Path = FIT_DIR) -> Optional[Dict]:
+    p = directory / f"{race_id}.json"
+    if not p.exists():
+        return None
+    return json.loads(p.read_text(encoding="utf-8"))
+
+
+def fitted_params(race_id: str) -> Dict:
+    # parametros listos para recommend_strategy (vacio si no hay ajuste cacheado)
+    fit = load_fit(race_id)
+    return dict(fit["recommend_args"]) if fit and fit.get("ok") else {}
+
+
+if __name__ == "__main__":
+    # python -m src.degradation_fit vueltas.csv [mas.csv ...] --race demo_mexico_2024
+    ap = argparse.ArgumentParser(description="Ajusta base y degradacion por compuesto desde CSV de vueltas")
+    ap.add_argument("csv", nargs="+")
+    ap.add_argument("--race", help="race_id para cachear el ajuste (lo usa recommend_strategy en el chat)")
+    ap.add_argument("--outlier-mad", type=float, default=3.0)
+    a = ap.parse_args()
+    res = fit_files(a.csv, a.race, a.outlier_mad)
+    print(json.dumps(res, indent=2, ensure_ascii=False))
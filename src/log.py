@@ -1,10 +1,16 @@
 from pathlib import Path
 from datetime import datetime
-import json
+import json, os
 
 LOG_DIR = Path("logs"); LOG_DIR.mkdir(exist_ok=True)
 LOG_FILE = LOG_DIR / "interactions.jsonl"
+# "jsonl" (por defecto) o "segments" (bloques comprimidos + indice, ver log_segments.py)
+LOG_SINK = os.getenv("LOG_SINK", "jsonl").lower()
 
 def jdump(event: dict):
     event = {"ts": datetime.utcnow().isoformat()+"Z", **event}
+    if LOG_SINK == "segments":
+        from .log_segments import get_writer
+        get_writer().write(event)
+        return
     LOG_FILE.open("a", encoding="utf-8").write(json.dumps(event, ensure_ascii=False) + "\n")
@@ -0,0 +1,189 @@
+import os, json, gzip, time, atexit, threading
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import zstandard as zstd
+except ImportError:  # zstd es opcional; gzip siempre esta disponible
+    zstd = None
+
+# Formato de segmento:
+#   logs/segments/<inicio>.<ext>            bloques comprimidos, uno tras otro (.gz o .zst)
+#   logs/segments/<inicio>.<ext>.idx        una linea JSON por bloque:
+#       {"t0": epoch_min, "t1": epoch_max, "off": byte_offset, "len": bytes, "n": eventos}
+# Cada bloque es un miembro gzip (o frame zstd) independiente, asi que el lector
+# puede hacer seek al offset y descomprimir solo los bloques que tocan la ventana.
+# <inicio> es la hora UTC de creacion: el lector descarta segmentos enteros sin abrir su .idx.
+
+SEGMENT_DIR = Path("logs") / "segments"
+CODECS = ("gzip", "zstd")
+EXT = {"gzip": "gz", "zstd": "zst"}
+_EXT_CODEC = {"gz": "gzip", "zst": "zstd", "gzip": "gzip", "zstd": "zstd"}   # tambien nombres antiguos
+_NAME_FMT = "%Y%m%dT%H%M%S%fZ"
+_SLACK_S = 300.0        # margen: un bloque puede llevar eventos de antes de crear el segmento
+
+
+def _ts_epoch(ts) -> float:
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, datetime):
+        dt = ts
+    else:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _compress(codec: str, raw: bytes) -> bytes:
+    if codec == "zstd":
+        return zstd.ZstdCompressor().compress(raw)
+    return gzip.compress(raw)
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zstd":
+        return zstd.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+class SegmentWriter:
+    def __init__(self, directory: Path = SEGMENT_DIR, codec: str = "gzip",
+                 block_events: int = 256, block_flush_s: float = 5.0,
+                 segment_max_bytes: int = 64 * 1024 * 1024):
+        if codec not in CODECS:
+            raise ValueError(f"Codec no soportado: {codec}")
+        if codec == "zstd" and zstd is None:
+            raise ValueError("Codec 'zstd' requiere el paquete 'zstandard'")
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.codec = codec
+        self.block_events = block_events
+        self.block_flush_s = block_flush_s
+        self.segment_max_bytes = segment_max_bytes
+        self._buf: List[bytes] = []
+        self._t0: Optional[float] = None
+        self._t1: Optional[float] = None
+        self._opened = time.monotonic()
+        self._seg: Optional[Path] = None
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    def _segment(self) -> Path:
+        if self._seg is None or self._seg.stat().st_size >= self.segment_max_bytes:
+            name = datetime.now(timezone.utc).strftime(_NAME_FMT)
+            self._seg = self.dir / f"{name}.{EXT[self.codec]}"
+            self._seg.touch()
+        return self._seg
+
+    def write(self, event: dict):
+        t = _ts_epoch(event["ts"])
+        line = json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            if not self._buf:
+                self._opened = time.monotonic()
+                # sin mas escrituras el bloque se cierra igual a los block_flush_s
+                self._timer = threading.Timer(self.block_flush_s, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            self._buf.append(line)
+            self._t0 = t if self._t0 is None else min(self._t0, t)
+            self._t1 = t if self._t1 is None else max(self._t1, t)
+            if (len(self._buf) >= self.block_events
+                    or time.monotonic() - self._opened >= self.block_flush_s):
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._buf:
+                return
+            seg = self._segment()
+            blob = _compress(self.codec, b"".join(self._buf))
+            with seg.open("ab") as f:
+                off = f.tell()
+                f.write(blob)
+            entry = {"t0": self._t0, "t1": self._t1, "off": off, "len": len(blob), "n": len(self._buf)}
+            with open(f"{seg}.idx", "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._buf, self._t0, self._t1 = [], None, None
+
+
+# ----- Lectura -----
+def _segments(directory: Path) -> List[Path]:
+    return sorted(p for p in Path(directory).iterdir()
+                  if p.suffix.lstrip(".") in _EXT_CODEC)
+
+
+def _seg_start(seg: Path) -> Optional[float]:
+    try:
+        return datetime.strptime(seg.name.split(".")[0], _NAME_FMT).replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def _index(seg: Path) -> List[Dict]:
+    idx = Path(f"{seg}.idx")
+    if not idx.exists():
+        return []
+    with idx.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def read_window(start, end=None, directory: Path = SEGMENT_DIR) -> Iterator[dict]:
+    """Eventos con start <= ts <= end, descomprimiendo solo los bloques necesarios."""
+    t_start = _ts_epoch(start)
+    t_end = _ts_epoch(end) if end is not None else float("inf")
+    if not Path(directory).exists():
+        return
+    segs = _segments(directory)
+    starts = [_seg_start(p) for p in segs] + [None]
+    for i, seg in enumerate(segs):
+        # los nombres van en orden de creacion: un segmento solo tiene eventos anteriores
+        # al inicio del siguiente y (salvo el margen) posteriores al suyo
+        if starts[i] is not None and starts[i] - _SLACK_S > t_end:
+            break
+        if starts[i + 1] is not None and starts[i + 1] + _SLACK_S < t_start:
+            continue
+        blocks = [b for b in _index(seg) if b["t1"] >= t_start and b["t0"] <= t_end]
+        if not blocks:
+            continue
+        codec = _EXT_CODEC[seg.suffix.lstrip(".")]
+        with seg.open("rb") as f:
+            for b in blocks:
+                f.seek(b["off"])
+                raw = _decompress(codec, f.read(b["len"]))
+                for line in raw.splitlines():
+                    ev = json.loads(line)
+                    if t_start <= _ts_epoch(ev["ts"]) <= t_end:
+                        yield ev
+
+
+def read_last(seconds: float, directory: Path = SEGMENT_DIR) -> Iterator[dict]:
+    return read_window(time.time() - seconds, None, directory)
+
+
+# ----- Writer global para jdump -----
+_writer: Optional[SegmentWriter] = None
+
+def get_writer() -> SegmentWriter:
+    global _writer
+    if _writer is None:
+        _writer = SegmentWriter(
+            codec=os.getenv("LOG_CODEC", "gzip"),
+            block_events=int(os.getenv("LOG_BLOCK_EVENTS", "256")),
+            block_flush_s=float(os.getenv("LOG_BLOCK_FLUSH_S", "5")),
+        )
+        atexit.register(_writer.flush)
+    return _writer
+
+
+if __name__ == "__main__":
+    # python -m src.log_segments [segundos]   (por defecto: ultima hora)
+    import sys
+    secs = float(sys.argv[1]) if len(sys.argv) > 1 else 3600.0
+    for ev in read_last(secs):
+        print(json.dumps(ev, ensure_ascii=False))
@@ -1,10 +1,43 @@
 
 import os
-from .mcp_f1_server import mcp  
+from contextlib import asynccontextmanager
+from .mcp_f1_server import mcp, shutdown_solver, warm_solver
+from .admission import install
+
+# Limites por cliente, carriles y cola acotada (ADMISSION=0 los desactiva); estado en GET /limits.
+ADMISSION = install(mcp)
+
+# WORKERS>1: varios procesos uvicorn detras del mismo puerto. Las sesiones HTTP
+# son stateless para que cualquier worker pueda atender cualquier peticion.
+WORKERS = int(os.getenv("WORKERS", "1"))
+TRANSPORT = os.getenv("TRANSPORT", "http")      # http | sse
+
+def create_app(stateless: bool = True):
+    app = mcp.http_app(transport=TRANSPORT, **({"stateless_http": stateless} if TRANSPORT == "http" else {}))
+    inner = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(a):
+        # cada proceso arranca su pool sin esperar a la primera peticion y lo para al salir
+        warm_solver()
+        try:
+            async with inner(a) as state:
+                yield state
+        finally:
+            shutdown_solver()
+
+    app.router.lifespan_context = lifespan
+    return app
 
 if __name__ == "__main__":
+    import uvicorn
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", "8000"))
-    
-    mcp.run(transport="http", host=host, port=port)
-    
+
+    if WORKERS > 1:
+        # las sesiones SSE viven en un proceso: repartidas entre workers se pierden
+        if TRANSPORT != "http":
+            raise SystemExit("WORKERS>1 requiere TRANSPORT=http")
+        uvicorn.run("src.mcp_f1_http:create_app", factory=True, host=host, port=port, workers=WORKERS)
+    else:
+        uvicorn.run(create_app(stateless=False), host=host, port=port, timeout_graceful_shutdown=0)
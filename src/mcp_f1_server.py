@@ -1,138 +1,381 @@
-import asyncio, json
-from dataclasses import dataclass
-from typing import Dict, List, Literal
+import asyncio, json, multiprocessing, os, threading, time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List
+from typing_extensions import TypedDict
 from starlette.responses import PlainTextResponse
 from starlette.requests import Request
 
 
 from fastmcp import FastMCP
+from fastmcp.exceptions import ToolError
+
+# Carreras en data/races.json (o F1_RACES_FILE), indexadas por id, temporada y circuito.
+from .race_catalog import CATALOG
+# Solver puro en strategy_solver.py (importable sin FastMCP, p.ej. desde los workers).
+from .strategy_solver import solve_strategy, solve_strategy_anytime, analyze_sensitivity, solve_team_strategy
 
 
 mcp = FastMCP("f1-strategy-mcp")
 
-# ----- Datos DEMO -----
-@dataclass
-class Race:
+# ----- Pool del solver -----
+# El solver es CPU puro: se ejecuta fuera del event loop para que /health y el
+# resto de clientes sigan respondiendo mientras dura una enumeracion pesada.
+SOLVER_POOL = os.getenv("F1_SOLVER_POOL", "process").lower()      # "process" | "thread"
+# Con WORKERS procesos uvicorn (mcp_f1_http) cada uno tiene su pool: se reparten los nucleos.
+SOLVER_WORKERS = int(os.getenv("F1_SOLVER_WORKERS",
+                               str(max(1, (os.cpu_count() or 2) // max(1, int(os.getenv("WORKERS", "1")))))))
+SOLVER_MAX_QUEUE = int(os.getenv("F1_SOLVER_MAX_QUEUE", "32"))     # peticiones esperando worker
+SOLVER_TIMEOUT_S = float(os.getenv("F1_SOLVER_TIMEOUT_S", "30"))
+# con deadline_ms se espera como mucho el plazo mas este margen (el solver lo mira cada 256 nodos)
+DEADLINE_GRACE_S = float(os.getenv("F1_DEADLINE_GRACE_S", "0.5"))
+
+_executor: Executor | None = None
+_inflight = 0
+# Single-flight: peticiones identicas concurrentes comparten un mismo calculo.
+_pending: Dict[str, list] = {}        # key -> [tarea, clientes esperando]
+
+# Modo tablas: F1_STRATEGY_TABLES=1 responde por lookup en las tablas de
+# `python -m src.strategy_tables` y usa el solver solo fuera de la malla o cerca de una frontera.
+TABLES = None
+if os.getenv("F1_STRATEGY_TABLES", "0").lower() in ("1", "true", "yes"):
+    from .strategy_tables import StrategyTables
+    TABLES = StrategyTables()
+
+def _get_executor() -> Executor:
+    global _executor
+    with _pool_lock:
+        if _executor is None:
+            if SOLVER_POOL == "thread":
+                _executor = ThreadPoolExecutor(max_workers=SOLVER_WORKERS)
+            else:
+                # spawn, no fork: en modo stdio un hijo con fork cierra el stdin heredado y se
+                # bloquea en el lock que tiene el hilo lector del transporte
+                _executor = ProcessPoolExecutor(max_workers=SOLVER_WORKERS, mp_context=_MP)
+    return _executor
+
+_MP = multiprocessing.get_context("spawn")
+_manager = None
+_pool_lock = threading.Lock()
+_warm: Future | None = None
+
+def _cancel_event():
+    # Evento visible desde el worker: threading.Event en modo hilo, proxy de Manager en modo proceso.
+    global _manager
+    if SOLVER_POOL == "thread":
+        return threading.Event()
+    with _pool_lock:
+        if _manager is None:
+            _manager = _MP.Manager()
+    return _manager.Event()
+
+def _warm_up(fut: Future):
+    try:
+        ex = _get_executor()
+        if SOLVER_POOL != "thread":
+            _cancel_event()
+            # un no-op por worker: los procesos spawn se crean bajo demanda
+            for f in [ex.submit(int) for _ in range(SOLVER_WORKERS)]:
+                f.result()
+    finally:
+        fut.set_result(None)
+
+def warm_solver() -> Future:
+    # Arranca (una sola vez, en segundo plano) el pool y el Manager de cancelacion. Los
+    # servidores HTTP lo llaman al arrancar; en stdio queda perezoso hasta el primer uso.
+    global _warm
+    with _pool_lock:
+        if _warm is None:
+            _warm = Future()
+            _warm.set_running_or_notify_cancel()        # nadie puede cancelarlo a medias
+            threading.Thread(target=_warm_up, args=(_warm,), name="solver-warmup", daemon=True).start()
+    return _warm
+
+def shutdown_solver():
+    # Para el pool y el Manager al cerrar el servidor HTTP: uvicorn vuelve a lanzar el SIGTERM
+    # tras su shutdown y los atexit no llegan a correr (los procesos spawn quedarian huerfanos).
+    # Como el atexit de concurrent.futures, espera a los calculos que ya estan en marcha.
+    global _executor, _manager, _warm
+    if _warm is not None:
+        _warm.result()
+    with _pool_lock:
+        ex, man = _executor, _manager
+        _executor = _manager = _warm = None
+    if ex is not None:
+        ex.shutdown(wait=True, cancel_futures=True)
+    if man is not None:
+        man.shutdown()
+
+async def solver_ready():
+    fut = warm_solver()
+    if not fut.done():
+        await asyncio.wrap_future(fut)
+
+def _release(_f=None):
+    global _inflight
+    _inflight -= 1
+
+async def run_solver(fn, *args, cancellable: bool = False, wait_until: float | None = None, **kwargs) -> Dict:
+    # Limite de cola: si ya hay workers + cola ocupados, respondemos rapido en vez de encolar sin fin.
+    # Mismo contrato que el control de admision HTTP: error de herramienta "overloaded: ...".
+    global _inflight
+    if _inflight >= SOLVER_WORKERS + SOLVER_MAX_QUEUE:
+        raise ToolError(f"overloaded: solver queue full ({_inflight} in flight)")
+    # wait_until: instante (time.monotonic) en que se deja de esperar, p.ej. el deadline del cliente
+    timeout_s = SOLVER_TIMEOUT_S
+    if wait_until is not None:
+        timeout_s = max(0.0, min(SOLVER_TIMEOUT_S, wait_until - time.monotonic()))
+    # el slot se reserva antes de cualquier trabajo y se libera cuando el worker termina de
+    # verdad, no cuando el cliente deja de esperar: un calculo no cancelable sigue ocupando
+    # su worker tras el timeout
+    _inflight += 1
+    cancel = None
+    try:
+        if cancellable:
+            # el solver revisa este evento y corta en cuanto se cancela la peticion
+            cancel = kwargs["cancel"] = _cancel_event()
+        cfut = _get_executor().submit(partial(fn, *args, **kwargs))
+    except BaseException:
+        _release()
+        raise
+    loop = asyncio.get_running_loop()
+    cfut.add_done_callback(lambda f: loop.call_soon_threadsafe(_release, f))
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(cfut), timeout=timeout_s)
+    except asyncio.TimeoutError:
+        if cancel is not None:
+            cancel.set()
+        return {"ok": False, "error": f"solver timeout after {round(timeout_s, 3)}s"}
+    except asyncio.CancelledError:
+        if cancel is not None:
+            cancel.set()
+        raise
+
+async def coalesce(key: str, factory):
+    # El primero crea la tarea; el resto la espera. shield() evita que un cliente
+    # que se desconecta cancele el calculo que otros siguen esperando; solo si se
+    # van todos los que esperan se cancela la tarea compartida.
+    entry = _pending.get(key)
+    if entry is None:
+        task = asyncio.create_task(factory())
+        entry = _pending[key] = [task, 0]
+        task.add_done_callback(lambda _t: _pending.pop(key, None))
+    entry[1] += 1
+    try:
+        return await asyncio.shield(entry[0])
+    except asyncio.CancelledError:
+        if entry[1] == 1:
+            entry[0].cancel()
+        raise
+    finally:
+        entry[1] -= 1
+
+def canonical_key(tool: str, **args) -> str:
+    return json.dumps([tool, args], sort_keys=True, separators=(",", ":"))
+
+
+# --- Salida estructurada -----
+# Las herramientas devuelven dicts tipados: FastMCP publica el outputSchema,
+# envia structuredContent y un texto JSON compacto como fallback.
+class CalendarRace(TypedDict):
     race_id: str
+    name: str
+    laps: int
+
+class CalendarOut(TypedDict):
     season: int
+    races: List[CalendarRace]
+
+class RaceOut(TypedDict, total=False):
+    ok: bool
+    error: str
+    race_id: str
     name: str
+    season: int
     laps: int
     pit_loss_s: float
-    compounds: List[Literal["SOFT", "MEDIUM", "HARD"]]
-
-RACES: Dict[str, Race] = {
-    "demo_mexico_2024": Race("demo_mexico_2024", 2024, "Demo Mexico City GP", 57, 20.0, ["SOFT", "MEDIUM", "HARD"]),
-    "demo_monza_2024": Race("demo_monza_2024", 2024, "Demo Italian GP (Monza)", 53, 18.5, ["SOFT", "MEDIUM", "HARD"]),
-}
-
-# ----- Utilidades ----
-def stint_time_s(base_laptime_s: float, deg_per_lap_s: float, stint_laps: int) -> float:
-    L = stint_laps
-    return L * base_laptime_s + deg_per_lap_s * (L * (L - 1) / 2.0)
-
-def enumerate_splits(total_laps: int, min_stint: int, max_stint: int, max_stops: int) -> List[List[int]]:
-    plans: List[List[int]] = []
-    def rec(rem: int, cur: List[int], left: int):
-        if left == 1:
-            if min_stint <= rem <= max_stint: plans.append(cur + [rem])
-            return
-        for x in range(min_stint, max_stint + 1):
-            if x > rem: break
-            if rem - x < (left - 1) * min_stint: continue
-            if rem - x > (left - 1) * max_stint: continue
-            rec(rem - x, cur + [x], left - 1)
-    for k in range(1, max_stops + 2):
-        if k * min_stint <= total_laps <= k * max_stint:
-            rec(total_laps, [], k)
-    return plans
-
-def all_compound_sequences(comps: List[str], k: int) -> List[List[str]]:
-    if k == 0: return [[]]
-    res: List[List[str]] = []
-    def rec(cur: List[str]):
-        if len(cur) == k: res.append(cur[:]); return
-        for c in comps:
-            cur.append(c); rec(cur); cur.pop()
-    rec([])
-    return res
-
-def solve_strategy(
-    race: Race,
-    base_laptime_s: float,
-    deg_profile: Dict[str, float],
-    min_stint_laps: int,
-    max_stint_laps: int,
-    max_stops: int = 2,
-    enforce_two_compounds: bool = True
-) -> Dict:
-    best = None
-    splits = enumerate_splits(race.laps, min_stint_laps, max_stint_laps, max_stops)
-    cache: Dict[int, List[List[str]]] = {}
-    for plan in splits:
-        k = len(plan)
-        if k not in cache:
-            cache[k] = all_compound_sequences(race.compounds, k)
-        for seq in cache[k]:
-            # Regla de la FIA: si hay ≥2 stints, deben usarse ≥2 compuestos distintos (carrera seca)
-            if enforce_two_compounds and k >= 2 and len(set(seq)) < 2:
-                continue
-
-            total = 0.0
-            breakdown: List[float] = []
-            for laps, comp in zip(plan, seq):
-                stint = stint_time_s(base_laptime_s, deg_profile.get(comp, 0.0), laps)
-                breakdown.append(stint)
-                total += stint
-            total += (k - 1) * race.pit_loss_s
-
-            if (best is None) or (total < best[0]):
-                stops, acc = [], 0
-                for i in range(k - 1):
-                    acc += plan[i]
-                    stops.append(acc)
-                best = (total, plan, seq, stops, breakdown)
-
-    if best is None:
-        return {"ok": False, "error": "No feasible plan with given constraints."}
-
-    total, plan, seq, stops, bd = best
-    return {
-        "ok": True,
-        "race_id": race.race_id,
-        "strategy": [f"{c}: {L}" for c, L in zip(seq, plan)],
-        "stop_laps": stops,
-        "predicted_total_s": round(total, 3),
-        "stint_breakdown_s": [round(x, 3) for x in bd],
-        "notes": f"{len(plan)-1} stop(s); pit_loss={race.pit_loss_s}s; base={base_laptime_s}s; deg={deg_profile}"
-    }
+    compounds: List[str]
+
+class StrategyOut(TypedDict, total=False):
+    ok: bool
+    error: str
+    race_id: str
+    strategy: List[str]
+    stop_laps: List[int]
+    predicted_total_s: float
+    stint_breakdown_s: List[float]
+    notes: str
+    exhaustive: bool
+    optimality_gap_s: float
+    nodes: int
+    source: str
+
+# "from"/"to" son palabras reservadas: sintaxis funcional de TypedDict
+ParamSegment = TypedDict("ParamSegment", {"from": float, "to": float, "strategy": List[str]})
+BreakEven = TypedDict("BreakEven", {"value": float, "from": List[str], "to": List[str]})
+
+class ParamSensitivity(TypedDict):
+    value: float
+    range: List[float]
+    stable_min: float
+    stable_max: float
+    break_even: List[BreakEven]
+    segments: List[ParamSegment]
+
+class SensitivityOut(TypedDict, total=False):
+    ok: bool
+    error: str
+    race_id: str
+    strategy: List[str]
+    predicted_total_s: float
+    parameters: Dict[str, ParamSensitivity]
+    solves: int
+    complete: bool
+
+class CarParams(TypedDict, total=False):
+    base_laptime_s: float
+    deg_soft_s: float
+    deg_medium_s: float
+    deg_hard_s: float
+    min_stint_laps: int
+    max_stint_laps: int
+    max_stops: int
+
+class TeamStrategyOut(TypedDict, total=False):
+    ok: bool
+    error: str
+    race_id: str
+    min_stop_separation: int
+    conflicts: int
+    penalty_s: float
+    team_total_s: float
+    pairs_checked: int
+    exhaustive: bool
+    car_a: StrategyOut
+    car_b: StrategyOut
+
+class CompoundFit(TypedDict):
+    base_s: float
+    deg_s: float
+    laps: int
+
+class FitOut(TypedDict, total=False):
+    ok: bool
+    error: str
+    race_id: str
+    laps_total: int
+    laps_used: int
+    compounds: Dict[str, CompoundFit]
+    fuel_s_per_unit: float
+    fuel_ref: float
+    recommend_args: Dict[str, float]
+    deg_clamped: List[str]
 
 
 # --- Herramientas MCP -----
 @mcp.tool()
-async def get_calendar(season: int) -> str:
+async def get_calendar(season: int) -> CalendarOut:
     cal = [{"race_id": r.race_id, "name": r.name, "laps": r.laps}
-           for r in RACES.values() if r.season == season]
-    return json.dumps({"season": season, "races": cal}, ensure_ascii=False, indent=2)
+           for r in CATALOG.season(season)]
+    return {"season": season, "races": cal}
 
 @mcp.tool()
-async def get_race(race_id: str) -> str:
-    r = RACES.get(race_id)
+async def get_race(race_id: str) -> RaceOut:
+    r = CATALOG.get(race_id)
     if not r:
-        return json.dumps({"ok": False, "error": "race_id not found"}, ensure_ascii=False)
-    return json.dumps({"ok": True, "race_id": r.race_id, "name": r.name, "season": r.season,
-                       "laps": r.laps, "pit_loss_s": r.pit_loss_s, "compounds": r.compounds},
-                      ensure_ascii=False, indent=2)
+        return {"ok": False, "error": "race_id not found"}
+    return {"ok": True, "race_id": r.race_id, "name": r.name, "season": r.season,
+            "laps": r.laps, "pit_loss_s": r.pit_loss_s, "compounds": r.compounds}
 
 @mcp.tool()
 async def recommend_strategy(race_id: str, base_laptime_s: float,
                              deg_soft_s: float, deg_medium_s: float, deg_hard_s: float,
-                             min_stint_laps: int, max_stint_laps: int, max_stops: int = 2) -> str:
-    r = RACES.get(race_id)
+                             min_stint_laps: int, max_stint_laps: int, max_stops: int = 2,
+                             deadline_ms: int | None = None) -> StrategyOut:
+    # deadline_ms: busqueda anytime; al vencer devuelve el mejor plan hasta ese momento
+    # con "exhaustive": false y una estimacion de "optimality_gap_s". Cuenta desde que llega
+    # la peticion: la espera en cola gasta parte del plazo; el arranque del pool no.
+    arrived = time.monotonic()
+    cold = deadline_ms is not None and not warm_solver().done()
+    r = CATALOG.get(race_id)
+    if not r:
+        return {"ok": False, "error": "race_id not found"}
+    deg = {"SOFT": deg_soft_s, "MEDIUM": deg_medium_s, "HARD": deg_hard_s}
+    if TABLES is not None:
+        hit = TABLES.lookup(r, base_laptime_s, deg, min_stint_laps, max_stint_laps, max_stops)
+        if hit is not None:
+            return hit
+    key = canonical_key("recommend_strategy", race_id=race_id, base_laptime_s=float(base_laptime_s),
+                        deg=deg, min_stint_laps=min_stint_laps, max_stint_laps=max_stint_laps,
+                        max_stops=max_stops, deadline_ms=deadline_ms)
+    if deadline_ms is not None:
+        # el arranque del pool (solo al principio del proceso) no cuenta en el plazo: con el
+        # pool en frio, el plazo empieza cuando esta listo
+        await solver_ready()
+        t_end = (time.monotonic() if cold else arrived) + deadline_ms / 1000.0
+        res = await coalesce(key, lambda: run_solver(
+            solve_strategy_anytime, r, base_laptime_s, deg, min_stint_laps, max_stint_laps,
+            max_stops, enforce_two_compounds=True, deadline_at=t_end, cancellable=True,
+            wait_until=t_end + DEADLINE_GRACE_S))
+        # los errores de cola/timeout de run_solver no traen el flag
+        return res if "exhaustive" in res else {**res, "exhaustive": False}
+    return await coalesce(key, lambda: run_solver(solve_strategy, r, base_laptime_s, deg, min_stint_laps,
+                                                  max_stint_laps, max_stops, enforce_two_compounds=True))
+
+@mcp.tool()
+async def recommend_team_strategy(race_id: str, car_a: CarParams, car_b: CarParams,
+                                  min_stop_separation: int = 2,
+                                  stack_penalty_s: float | None = None) -> TeamStrategyOut:
+    # Plan conjunto: las paradas de ambos coches quedan a >= min_stop_separation vueltas.
+    # Con stack_penalty_s se permite el doble stop sumando la penalizacion por conflicto.
+    r = CATALOG.get(race_id)
+    if not r:
+        return {"ok": False, "error": "race_id not found"}
+    required = ("base_laptime_s", "deg_soft_s", "deg_medium_s", "deg_hard_s", "min_stint_laps", "max_stint_laps")
+    for name, car in (("car_a", car_a), ("car_b", car_b)):
+        missing = [k for k in required if k not in car]
+        if missing:
+            return {"ok": False, "error": f"{name} missing {missing}"}
+    return await run_solver(solve_team_strategy, r, dict(car_a), dict(car_b), min_stop_separation,
+                            stack_penalty_s, enforce_two_compounds=True)
+
+# CSVs de vueltas accesibles para fit_degradation (no se leen rutas fuera de este directorio)
+LAPS_DIR = Path(os.getenv("F1_LAPS_DIR", "data/laps")).resolve()
+
+@mcp.tool()
+async def fit_degradation(race_id: str, csv_files: List[str]) -> FitOut:
+    # Ajusta base y degradacion por compuesto desde CSVs en F1_LAPS_DIR y cachea el
+    # resultado por carrera; "recommend_args" se pasa tal cual a recommend_strategy.
+    from .degradation_fit import fit_files
+    if not CATALOG.get(race_id):
+        return {"ok": False, "error": "race_id not found"}
+    paths = []
+    for name in csv_files:
+        p = (LAPS_DIR / name).resolve()
+        if LAPS_DIR not in p.parents or not p.is_file():
+            return {"ok": False, "error": f"csv not found in {LAPS_DIR}: {name}"}
+        paths.append(str(p))
+    try:
+        return await run_solver(fit_files, paths, race_id)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+
+@mcp.tool(name="analyze_sensitivity")
+async def analyze_sensitivity_tool(race_id: str, base_laptime_s: float,
+                                   deg_soft_s: float, deg_medium_s: float, deg_hard_s: float,
+                                   min_stint_laps: int, max_stint_laps: int, max_stops: int = 2,
+                                   parameters: List[str] | None = None,
+                                   ranges: Dict[str, List[float]] | None = None) -> SensitivityOut:
+    # Por parametro: intervalo en que el plan optimo no cambia y valores de break-even.
+    # parameters: subconjunto de deg_soft_s, deg_medium_s, deg_hard_s, pit_loss_s, base_laptime_s
+    # ranges: {"deg_soft_s": [min, max], ...} para acotar la busqueda
+    r = CATALOG.get(race_id)
     if not r:
-        return json.dumps({"ok": False, "error": "race_id not found"}, ensure_ascii=False)
+        return {"ok": False, "error": "race_id not found"}
     deg = {"SOFT": deg_soft_s, "MEDIUM": deg_medium_s, "HARD": deg_hard_s}
-    res = solve_strategy(r, base_laptime_s, deg, min_stint_laps, max_stint_laps, max_stops, enforce_two_compounds=True)
-    return json.dumps(res, ensure_ascii=False, indent=2)
+    return await run_solver(analyze_sensitivity, r, base_laptime_s, deg, min_stint_laps, max_stint_laps,
+                            max_stops, enforce_two_compounds=True, params=parameters, ranges=ranges)
 
 @mcp.custom_route("/health", methods=["GET"])
 async def health(_req: Request) -> PlainTextResponse:
@@ -0,0 +1,232 @@
+import argparse, asyncio, base64, hashlib, json, os, sys, time
+from contextlib import AsyncExitStack
+from typing import Callable, Dict, Optional
+from mcp import ClientSession
+from .log import jdump
+from .mcp_peers import build_transport, content_text, load_peers, open_session
+
+# Transferencia de archivos grandes por el servidor MCP de filesystem, en trozos acotados.
+#   python3 -m src.mcp_fs_transfer put telemetria.bin sandbox/telemetria.bin
+#   python3 -m src.mcp_fs_transfer get sandbox/telemetria.bin copia.bin
+#   python3 -m src.mcp_fs_transfer peek sandbox/logs.txt --tail 20
+#
+# El servidor solo escribe archivos completos (write_file) y sus lecturas parciales
+# (head/tail) son por lineas desde el principio o el final, no por offset. Por eso el
+# archivo remoto se guarda troceado:
+#   <remoto>.chunks/00000.b64 ...   cada trozo en base64 (write_file solo acepta texto)
+#   <remoto>.chunks/manifest.json   tamanos y sha256 por trozo y del archivo completo
+# El manifest se escribe al final: si existe, la subida esta completa.
+# En memoria hay como mucho 'inflight' trozos a la vez, sea cual sea el tamano del archivo.
+
+CHUNK_BYTES = int(os.getenv("FS_CHUNK_BYTES", str(256 * 1024)))
+INFLIGHT = int(os.getenv("FS_INFLIGHT", "4"))
+MANIFEST = "manifest.json"
+
+Progress = Callable[[int, int, int, int], None]      # bytes hechos, bytes total, trozos hechos, total
+
+
+class TransferError(Exception):
+    pass
+
+
+def _chunks_dir(remote: str) -> str:
+    return remote.rstrip("/") + ".chunks"
+
+
+def _part(remote: str, i: int) -> str:
+    return f"{_chunks_dir(remote)}/{i:05d}.b64"
+
+
+async def _call(session: ClientSession, tool: str, args: Dict) -> str:
+    resp = await session.call_tool(tool, args)
+    txt = content_text(resp)
+    if getattr(resp, "isError", False):
+        raise TransferError(f"{tool}({args.get('path')}): {txt[:200]}")
+    return txt
+
+
+def _decode(txt: str, what: str) -> bytes:
+    try:
+        return base64.b64decode(txt, validate=True)
+    except ValueError:
+        raise TransferError(f"{what}: base64 invalido")
+
+
+async def _workers(coros, stop: Callable[[], None]) -> None:
+    # si un worker falla, stop() corta el reparto de trozos y se espera a que los demas
+    # terminen su llamada en curso: cerrar la sesion con respuestas pendientes rompe el transporte
+    tasks = [asyncio.create_task(c) for c in coros]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    if pending:
+        stop()
+        await asyncio.wait(pending)
+    for t in tasks:
+        if t.exception():
+            raise t.exception()
+
+
+def _file_sha256(path: str, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            b = f.read(block)
+            if not b:
+                return h.hexdigest()
+            h.update(b)
+
+
+async def upload(session: ClientSession, local: str, remote: str, chunk_bytes: int = CHUNK_BYTES,
+                 inflight: int = INFLIGHT, verify: bool = False, progress: Optional[Progress] = None) -> Dict:
+    size = os.path.getsize(local)
+    n = max(1, -(-size // chunk_bytes))
+    await _call(session, "create_directory", {"path": _chunks_dir(remote)})
+    chunks = [None] * n
+    done = [0, 0]
+    whole = hashlib.sha256()
+    nxt = [0]
+
+    async def worker(f):
+        # 'inflight' workers: cada uno lee su siguiente trozo solo cuando ha enviado el anterior
+        while nxt[0] < n:
+            i = nxt[0]
+            nxt[0] += 1
+            data = f.read(chunk_bytes)          # sin await entre indice y lectura: orden garantizado
+            whole.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            await _call(session, "write_file", {"path": _part(remote, i),
+                                               "content": base64.b64encode(data).decode("ascii")})
+            if verify:
+                back = await _call(session, "read_text_file", {"path": _part(remote, i)})
+                if hashlib.sha256(_decode(back, f"trozo {i}")).hexdigest() != digest:
+                    raise TransferError(f"trozo {i}: checksum distinto tras escribir")
+            chunks[i] = {"size": len(data), "sha256": digest}
+            done[0] += len(data)
+            done[1] += 1
+            if progress:
+                progress(done[0], size, done[1], n)
+
+    with open(local, "rb") as f:
+        await _workers((worker(f) for _ in range(max(1, inflight))), lambda: nxt.__setitem__(0, n))
+    manifest = {"version": 1, "size": size, "chunk_bytes": chunk_bytes, "sha256": whole.hexdigest(),
+                "chunks": chunks}
+    await _call(session, "write_file", {"path": f"{_chunks_dir(remote)}/{MANIFEST}",
+                                       "content": json.dumps(manifest)})
+    return {"ok": True, "remote": _chunks_dir(remote), "size": size, "chunks": n,
+            "sha256": manifest["sha256"]}
+
+
+async def download(session: ClientSession, remote: str, local: str, inflight: int = INFLIGHT,
+                   progress: Optional[Progress] = None) -> Dict:
+    try:
+        manifest = json.loads(await _call(session, "read_text_file",
+                                          {"path": f"{_chunks_dir(remote)}/{MANIFEST}"}))
+    except TransferError:
+        raise TransferError(f"sin manifest en {_chunks_dir(remote)} (subida incompleta o archivo no troceado)")
+    chunks, size = manifest["chunks"], manifest["size"]
+    offsets = [0]
+    for c in chunks[:-1]:
+        offsets.append(offsets[-1] + c["size"])
+    done = [0, 0]
+    todo = iter(range(len(chunks)))
+
+    tmp = local + ".part"
+    with open(tmp, "wb") as f:
+        f.truncate(size)
+
+        async def worker():
+            for i in todo:
+                data = _decode(await _call(session, "read_text_file", {"path": _part(remote, i)}), f"trozo {i}")
+                if len(data) != chunks[i]["size"] or hashlib.sha256(data).hexdigest() != chunks[i]["sha256"]:
+                    raise TransferError(f"trozo {i}: checksum o tamano distinto")
+                # cada trozo va a su offset: el orden de llegada no importa
+                f.seek(offsets[i])
+                f.write(data)
+                done[0] += len(data)
+                done[1] += 1
+                if progress:
+                    progress(done[0], size, done[1], len(chunks))
+
+        try:
+            await _workers((worker() for _ in range(max(1, inflight))), lambda: all(True for _ in todo))
+        except BaseException:
+            f.close()
+            os.remove(tmp)
+            raise
+    if _file_sha256(tmp) != manifest["sha256"]:
+        os.remove(tmp)
+        raise TransferError("sha256 del archivo completo distinto")
+    os.replace(tmp, local)
+    return {"ok": True, "local": local, "size": size, "chunks": len(chunks), "sha256": manifest["sha256"]}
+
+
+async def peek(session: ClientSession, remote: str, head: int | None = None, tail: int | None = None) -> str:
+    # lectura parcial nativa del servidor (primeras/ultimas N lineas) de un archivo de texto normal
+    args: Dict = {"path": remote}
+    if head:
+        args["head"] = head
+    if tail:
+        args["tail"] = tail
+    return await _call(session, "read_text_file", args)
+
+
+def _printer(label: str) -> Progress:
+    t0 = time.perf_counter()
+    def show(done: int, total: int, k: int, n: int):
+        dt = max(time.perf_counter() - t0, 1e-9)
+        pct = 100.0 * done / total if total else 100.0
+        print(f"\r{label} {k}/{n} trozos  {pct:5.1f}%  {done / dt / 1e6:6.2f} MB/s", end="", file=sys.stderr)
+        if k == n:
+            print(file=sys.stderr)
+    return show
+
+
+async def _main(a) -> Dict:
+    async with AsyncExitStack() as stack:
+        kind, param = build_transport(load_peers(a.peers)[a.peer])
+        session = await open_session(stack, kind, param)
+        # el error se devuelve dentro del stack: fuera llegaria envuelto en el TaskGroup del transporte
+        try:
+            if a.cmd == "put":
+                return await upload(session, a.src, a.dst, a.chunk_kb * 1024, a.inflight, a.verify,
+                                    _printer("put"))
+            if a.cmd == "get":
+                return await download(session, a.src, a.dst, a.inflight, _printer("get"))
+            return {"ok": True, "text": await peek(session, a.src, a.head, a.tail)}
+        except TransferError as e:
+            return {"ok": False, "error": str(e)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Transferencia troceada de archivos por el MCP de filesystem")
+    ap.add_argument("--peer", default="filesystem_official", help="alias en peers.json")
+    ap.add_argument("--peers", help="peers.json alternativo")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("put", "get"):
+        p = sub.add_parser(name)
+        p.add_argument("src")
+        p.add_argument("dst")
+        p.add_argument("--inflight", type=int, default=INFLIGHT, help="trozos en vuelo a la vez")
+        if name == "put":
+            p.add_argument("--chunk-kb", type=int, default=CHUNK_BYTES // 1024)
+            p.add_argument("--verify", action="store_true", help="relee cada trozo tras escribirlo")
+    pk = sub.add_parser("peek")
+    pk.add_argument("src")
+    pk.add_argument("--head", type=int)
+    pk.add_argument("--tail", type=int)
+    a = ap.parse_args()
+
+    t0 = time.perf_counter()
+    res = asyncio.run(_main(a))
+    if a.cmd == "peek" and res["ok"]:
+        print(res["text"])
+        return
+    res["seconds"] = round(time.perf_counter() - t0, 3)
+    print(json.dumps(res))
+    jdump({"type": "mcp_call", "server": a.peer, "tool": f"fs_transfer_{a.cmd}", "args": {"src": a.src, "dst": getattr(a, "dst", None)},
+           "result_preview": json.dumps(res)[:160]})
+    if not res["ok"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
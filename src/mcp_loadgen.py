@@ -0,0 +1,260 @@
+import argparse, asyncio, json, os, random, subprocess, sys, time
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Tuple
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
+from .log import jdump
+
+# Generador de carga open-loop contra los servidores HTTP/SSE locales.
+# Ejemplos:
+#   python3 -m src.mcp_loadgen --spawn f1 --sessions 8 --rate 50 --duration 30 \
+#       --mix get_calendar=5,recommend_strategy=1
+#   python3 -m src.mcp_loadgen --spawn trivial --mix ping=5,echo=3,sum_numbers=2
+
+WORKLOADS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "ping": ("ping", {}),
+    "echo": ("echo", {"text": "hola mcp"}),
+    "sum_numbers": ("sum_numbers", {"numbers": [float(i) for i in range(100)]}),
+    "get_calendar": ("get_calendar", {"season": 2024}),
+    "get_race": ("get_race", {"race_id": "demo_mexico_2024"}),
+    "recommend_strategy": ("recommend_strategy", {
+        "race_id": "demo_mexico_2024", "base_laptime_s": 80.0,
+        "deg_soft_s": 0.12, "deg_medium_s": 0.08, "deg_hard_s": 0.05,
+        "min_stint_laps": 8, "max_stint_laps": 35, "max_stops": 3,
+    }),
+}
+
+# Argumentos que varian en cada llamada (factor multiplicativo +-): si no, las llamadas
+# pesadas son identicas y el single-flight del servidor las colapsa en un solo calculo.
+JITTER: Dict[str, Dict[str, float]] = {
+    "recommend_strategy": {"base_laptime_s": 0.02, "deg_soft_s": 0.25, "deg_medium_s": 0.25,
+                           "deg_hard_s": 0.25},
+}
+
+
+def call_args(name: str, rng: random.Random | None) -> Dict[str, Any]:
+    args = WORKLOADS[name][1]
+    if rng is None or name not in JITTER:
+        return args
+    return {**args, **{k: round(args[k] * (1.0 + rng.uniform(-j, j)), 4) for k, j in JITTER[name].items()}}
+
+SERVERS = {
+    # modulo, transporte por defecto (los dos servidores aceptan TRANSPORT=http|sse)
+    "f1": ("src.mcp_f1_http", "http"),
+    "trivial": ("src.mcp_trivial_http", "sse"),
+}
+PATHS = {"http": "/mcp", "sse": "/sse"}      # ruta del endpoint por transporte
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    out = []
+    for part in spec.split(","):
+        name, _, w = part.strip().partition("=")
+        if name not in WORKLOADS:
+            raise ValueError(f"Workload desconocido: {name} (opciones: {', '.join(WORKLOADS)})")
+        out.append((name, float(w or 1)))
+    return out
+
+
+def percentile(sorted_vals: List[float], p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def _is_error(resp) -> bool:
+    if getattr(resp, "isError", False):
+        return True
+    for p in getattr(resp, "content", []) or []:
+        if getattr(p, "type", None) == "text":
+            try:
+                d = json.loads(p.text)
+            except Exception:
+                continue
+            if isinstance(d, dict) and d.get("ok") is False:
+                return True
+    return False
+
+
+class Stats:
+    def __init__(self):
+        self.window: List[Tuple[str, float, bool]] = []
+        self.total: List[Tuple[str, float, bool]] = []
+
+    def add(self, name: str, latency_s: float, err: bool):
+        rec = (name, latency_s, err)
+        self.window.append(rec)
+        self.total.append(rec)
+
+    @staticmethod
+    def summary(recs: List[Tuple[str, float, bool]], elapsed_s: float) -> Dict[str, Any]:
+        lat = sorted(r[1] * 1000.0 for r in recs)
+        errs = sum(1 for r in recs if r[2])
+        return {
+            "requests": len(recs),
+            "throughput_rps": round(len(recs) / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+            "error_rate": round(errs / len(recs), 4) if recs else 0.0,
+            "p50_ms": round(percentile(lat, 50), 2),
+            "p95_ms": round(percentile(lat, 95), 2),
+            "p99_ms": round(percentile(lat, 99), 2),
+            "max_ms": round(lat[-1], 2) if lat else 0.0,
+        }
+
+
+async def _open_session(stack: AsyncExitStack, transport: str, url: str,
+                        headers: Dict[str, str] | None = None) -> ClientSession:
+    if transport == "sse":
+        read, write = await stack.enter_async_context(sse_client(url=url, headers=headers))
+    else:
+        read, write, _ = await stack.enter_async_context(streamablehttp_client(url, headers=headers))
+    session = await stack.enter_async_context(ClientSession(read, write))
+    await session.initialize()
+    return session
+
+
+async def _one(session: ClientSession, name: str, args: Dict[str, Any], stats: Stats, timeout_s: float):
+    tool = WORKLOADS[name][0]
+    t0 = time.perf_counter()
+    try:
+        resp = await asyncio.wait_for(session.call_tool(tool, args), timeout=timeout_s)
+        err = _is_error(resp)
+    except Exception:
+        err = True
+    stats.add(name, time.perf_counter() - t0, err)
+
+
+async def run_load(url: str, transport: str, sessions: int, rate: float, duration_s: float,
+                   mix: List[Tuple[str, float]], seed: int = 0, report_every_s: float = 5.0,
+                   timeout_s: float = 30.0, client_ids: int = 0, same_args: bool = False) -> Dict[str, Any]:
+    if rate <= 0:
+        raise ValueError("rate debe ser > 0 (req/s)")
+    rng = random.Random(seed)
+    names = [n for n, _ in mix]
+    weights = [w for _, w in mix]
+    stats = Stats()
+
+    async with AsyncExitStack() as stack:
+        # client_ids>0: cada sesion se identifica como uno de N clientes (X-Client-Id),
+        # para probar los limites por cliente del servidor desde una sola maquina
+        pool = [await _open_session(stack, transport, url,
+                                    {"X-Client-Id": f"loadgen-{k % client_ids}"} if client_ids else None)
+                for k in range(sessions)]
+        tasks: List[asyncio.Task] = []
+        start = time.perf_counter()
+        next_report = start + report_every_s
+        last_report = start
+        i = 0
+        # Open-loop: las llegadas siguen un proceso de Poisson a 'rate' req/s,
+        # independientemente de cuanto tarde el servidor en responder.
+        t_next = start
+        while True:
+            now = time.perf_counter()
+            if now - start >= duration_s:
+                break
+            if now >= next_report:
+                print(json.dumps({"t_s": round(now - start, 1),
+                                  **Stats.summary(stats.window, now - last_report)}))
+                stats.window, last_report = [], now
+                next_report += report_every_s
+            if now < t_next:
+                await asyncio.sleep(min(t_next - now, next_report - now))
+                continue
+            name = rng.choices(names, weights)[0]
+            args = call_args(name, None if same_args else rng)
+            tasks.append(asyncio.create_task(_one(pool[i % sessions], name, args, stats, timeout_s)))
+            i += 1
+            t_next += rng.expovariate(rate)
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    by_tool = {}
+    for n in names:
+        recs = [r for r in stats.total if r[0] == n]
+        if recs:
+            by_tool[n] = Stats.summary(recs, elapsed)
+    return {"url": url, "sessions": sessions, "target_rps": rate, "duration_s": duration_s,
+            "seed": seed, "total": Stats.summary(stats.total, elapsed), "by_tool": by_tool}
+
+
+def _spawn(kind: str, port: int, transport: str) -> subprocess.Popen:
+    module, _ = SERVERS[kind]
+    env = {**os.environ, "HOST": "127.0.0.1", "PORT": str(port), "TRANSPORT": transport}
+    return subprocess.Popen([sys.executable, "-m", module], env=env)
+
+
+def _wait_health(port: int, timeout_s: float = 20.0):
+    import urllib.request
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                if r.status == 200:
+                    return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"Servidor en puerto {port} no respondio /health")
+
+
+def _server_limits(url: str) -> Dict[str, Any] | None:
+    # estado del control de admision del servidor (GET /limits), si lo expone
+    import urllib.parse, urllib.request
+    u = urllib.parse.urlsplit(url)
+    try:
+        with urllib.request.urlopen(f"{u.scheme}://{u.netloc}/limits", timeout=2) as r:
+            return json.loads(r.read())
+    except Exception:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load generator para los servidores MCP HTTP/SSE")
+    ap.add_argument("--spawn", choices=list(SERVERS), help="levanta el servidor local en --port")
+    ap.add_argument("--url", help="endpoint MCP (por defecto el del servidor --spawn)")
+    ap.add_argument("--transport", choices=["http", "sse"])
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--sessions", type=int, default=4)
+    ap.add_argument("--rate", type=float, default=20.0, help="req/s (open-loop)")
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--mix", default="ping=1")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--report-every", type=float, default=5.0)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--client-ids", type=int, default=0, help="reparte las sesiones entre N X-Client-Id")
+    ap.add_argument("--same-args", action="store_true",
+                    help="sin variar argumentos (mide el single-flight, no la capacidad del solver)")
+    a = ap.parse_args()
+
+    if a.rate <= 0:
+        ap.error("--rate debe ser > 0 (llegadas open-loop en req/s)")
+    transport, url = a.transport, a.url
+    if a.spawn:
+        transport = transport or SERVERS[a.spawn][1]
+        url = url or f"http://127.0.0.1:{a.port}{PATHS[transport]}"
+    if not url:
+        ap.error("indica --url o --spawn")
+    transport = transport or "http"
+
+    proc = None
+    try:
+        if a.spawn:
+            proc = _spawn(a.spawn, a.port, transport)
+            _wait_health(a.port)
+        report = asyncio.run(run_load(url, transport, a.sessions, a.rate, a.duration,
+                                      parse_mix(a.mix), a.seed, a.report_every, a.timeout,
+                                      a.client_ids, a.same_args))
+        limits = _server_limits(url)
+        if limits is not None:
+            report["server_limits"] = limits
+        print(json.dumps(report, indent=2))
+        jdump({"type": "loadgen", **report})
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import asyncio, importlib, json, os
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
+
+# Configuracion de peers (peers.json) y apertura de sesiones MCP, compartido por el chat,
+# el runner de escenarios y el puente de herramientas del LLM.
+
+PEERS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "peers.json")
+
+
+def load_peers(path: str | None = None) -> Dict[str, dict]:
+    with open(path or PEERS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_transport(cfg: dict):
+    t = (cfg.get("type") or "stdio").lower()
+    if t == "stdio":
+        command = cfg["command"]
+        args = cfg.get("args", [])
+        cwd = cfg.get("cwd")
+        return ("stdio", StdioServerParameters(command=command, args=args, cwd=cwd, env=cfg.get("env")))
+    if t == "sse":
+        url = cfg.get("url")
+        if not url:
+            raise ValueError("Peer 'sse' requiere 'url'")
+        return ("sse", url)
+    if t in ("streamable-http", "http"):
+        url = cfg.get("url")
+        if not url:
+            raise ValueError("Peer 'streamable-http' requiere 'url'")
+        return ("http", cfg)
+    if t == "inprocess":
+        # servidor FastMCP importado en este proceso: "module" (y opcional "object", por defecto mcp).
+        # "attrs" fija variables del modulo antes de abrir la sesion (lo que en un subproceso
+        # iria en su entorno), sin tocar os.environ del proceso ni de sus hijos
+        if not cfg.get("module"):
+            raise ValueError("Peer 'inprocess' requiere 'module'")
+        return ("inprocess", cfg)
+    raise ValueError(f"Tipo de peer no soportado: {t}")
+
+
+async def open_session(stack: AsyncExitStack, kind: str, param, httpx_client_factory=None) -> ClientSession:
+    # sesion inicializada; se cierra con el stack
+    if kind == "inprocess":
+        from fastmcp import Client
+        module = importlib.import_module(param["module"])
+        for k, v in (param.get("attrs") or {}).items():
+            setattr(module, k, v)
+        server = getattr(module, param.get("object", "mcp"))
+        client = await stack.enter_async_context(Client(server))
+        return client.session
+    if kind == "stdio":
+        read, write = await stack.enter_async_context(stdio_client(param))
+    elif kind == "http":
+        kw = {"httpx_client_factory": httpx_client_factory} if httpx_client_factory else {}
+        read, write, _ = await stack.enter_async_context(
+            streamablehttp_client(param["url"], headers=param.get("headers"), **kw))
+    else:  # kind == "sse"
+        read, write = await stack.enter_async_context(sse_client(url=param))
+    session = await stack.enter_async_context(ClientSession(read, write))
+    await session.initialize()
+    return session
+
+
+def f1_server_config(transport: str | None = None) -> dict:
+    # Servidor F1 del chat y del puente de herramientas del LLM (F1_TRANSPORT: stdio | inprocess).
+    # En los dos casos hay un solo usuario: pool de hilos (sin arrancar procesos spawn, que en
+    # stdio se pagaria en cada /f1, ni pickling por llamada), salvo que F1_SOLVER_POOL diga otra cosa.
+    pool = os.getenv("F1_SOLVER_POOL", "thread").lower()
+    if (transport or os.getenv("F1_TRANSPORT", "stdio")).lower() == "inprocess":
+        return {"type": "inprocess", "module": "src.mcp_f1_server", "attrs": {"SOLVER_POOL": pool}}
+    return {"type": "stdio", "command": "python3", "args": ["-m", "src.mcp_f1_server"],
+            "env": {"F1_SOLVER_POOL": pool}}
+
+
+class SessionPool:
+    def __init__(self, peers: Dict[str, dict]):
+        self.peers = peers
+        self._ready: Dict[str, asyncio.Future] = {}
+        self._stop: Dict[str, asyncio.Event] = {}
+        self._tasks: Dict[asyncio.Task, asyncio.Future] = {}
+
+    async def _hold(self, alias: str, ready: asyncio.Future, stop: asyncio.Event):
+        # cada sesion vive en su propia tarea: los transportes (anyio) deben cerrarse
+        # en la misma tarea que los abrio
+        try:
+            async with AsyncExitStack() as stack:
+                kind, param = build_transport(self.peers[alias])
+                ready.set_result(await open_session(stack, kind, param))
+                await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            if not ready.done():
+                ready.set_exception(ConnectionError(f"peer '{alias}': conexion cancelada"))
+            # fallo al conectar o sesion muerta: el siguiente get() abre una nueva
+            if self._ready.get(alias) is ready:
+                del self._ready[alias]
+
+    async def get(self, alias: str):
+        if alias not in self.peers:
+            raise KeyError(f"peer '{alias}' no esta en peers.json")
+        if alias not in self._ready:
+            fut = self._ready[alias] = asyncio.get_running_loop().create_future()
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())   # sin avisos si nadie espera
+            stop = self._stop[alias] = asyncio.Event()
+            task = asyncio.create_task(self._hold(alias, fut, stop))
+            self._tasks[task] = fut
+            task.add_done_callback(lambda t: self._tasks.pop(t, None))
+        # shield: si quien espera se cancela (timeout), la conexion sigue para los demas
+        return await asyncio.shield(self._ready[alias])
+
+    def evict(self, alias: str):
+        # descarta la sesion (transporte roto, peer colgado); se cierra en su tarea y se
+        # reabre al pedirla de nuevo
+        fut = self._ready.pop(alias, None)
+        if fut is not None:
+            self._stop[alias].set()
+            if not fut.done():
+                for task, f in list(self._tasks.items()):
+                    if f is fut:
+                        task.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        for stop in self._stop.values():
+            stop.set()
+        # una conexion que no termina (peer colgado) no llega a esperar 'stop': se cancela
+        # (las ya descartadas con evict() estan cerrando; cancelarlas otra vez corta su limpieza)
+        live = set(self._ready.values())
+        for task, fut in list(self._tasks.items()):
+            if not fut.done() and fut in live:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def content_text(resp: Any) -> str:
+    out: List[str] = []
+    for p in getattr(resp, "content", []) or []:
+        if isinstance(p, dict) and p.get("type") == "text":
+            out.append(p.get("text", ""))
+        elif getattr(p, "type", None) == "text":
+            out.append(getattr(p, "text", ""))
+    return "\n".join(out).strip()
+
+
+def content_data(resp: Any):
+    # structuredContent si el servidor lo envia; si no, intenta parsear el texto
+    data = getattr(resp, "structuredContent", None)
+    if data is not None:
+        return data
+    txt = content_text(resp)
+    try:
+        return json.loads(txt)
+    except Exception:
+        return txt
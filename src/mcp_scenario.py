@@ -0,0 +1,209 @@
+import argparse, asyncio, json, re, time
+from typing import Any, Dict, List
+from .log import jdump
+from .mcp_peers import SessionPool, content_data, content_text, load_peers
+
+# Runner de escenarios declarativos contra peers de peers.json.
+#   python3 -m src.mcp_scenario scenarios/f1_smoke.json [otro.json ...] [--repeat 3]
+#
+# Escenario (un objeto o una lista de objetos por archivo):
+#   {"name": "f1_smoke", "peer": "f1_local",
+#    "steps": [
+#      {"id": "cal",  "tool": "get_calendar", "args": {"season": 2024}},
+#      {"id": "race", "tool": "get_race", "args": {"race_id": "${cal.races.0.race_id}"}},
+#      {"id": "ls",   "peer": "trivial_local", "list_tools": true},
+#      {"id": "done", "tool": "ping", "peer": "trivial_local", "after": ["race"]}]}
+#
+# Un paso espera a los de "after" y a los que referencia con ${id.ruta}; el resto se lanza
+# a la vez sobre la misma sesion del peer. Las sesiones se abren una vez y se reutilizan
+# entre escenarios (y entre repeticiones).
+
+REF = re.compile(r"\$\{([A-Za-z0-9_\-]+)((?:\.[^.}]+)*)\}")
+
+
+def _lookup(data: Any, path: str) -> Any:
+    for part in filter(None, path.split(".")):
+        data = data[int(part)] if isinstance(data, list) else data[part]
+    return data
+
+
+def _resolve(value: Any, results: Dict[str, Any]) -> Any:
+    # "${id.a.0}" completo conserva el tipo; dentro de otro texto se inserta como str
+    if isinstance(value, str):
+        m = REF.fullmatch(value)
+        if m:
+            return _lookup(results[m.group(1)], m.group(2))
+        return REF.sub(lambda m: str(_lookup(results[m.group(1)], m.group(2))), value)
+    if isinstance(value, list):
+        return [_resolve(v, results) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve(v, results) for k, v in value.items()}
+    return value
+
+
+def _deps(step: Dict) -> List[str]:
+    refs = REF.findall(json.dumps(step.get("args", {})))
+    return list(dict.fromkeys(list(step.get("after", [])) + [r[0] for r in refs]))
+
+
+def _check(steps: List[Dict]) -> Dict[str, List[str]]:
+    ids = [s["id"] for s in steps]
+    if len(set(ids)) != len(ids):
+        raise ValueError("ids de paso repetidos")
+    deps = {s["id"]: _deps(s) for s in steps}
+    for sid, ds in deps.items():
+        for d in ds:
+            if d not in deps:
+                raise ValueError(f"paso '{sid}' depende de '{d}', que no existe")
+    # orden topologico solo para detectar ciclos
+    done, visiting = set(), set()
+    def visit(n):
+        if n in done:
+            return
+        if n in visiting:
+            raise ValueError(f"ciclo de dependencias en '{n}'")
+        visiting.add(n)
+        for d in deps[n]:
+            visit(d)
+        visiting.discard(n)
+        done.add(n)
+    for n in deps:
+        visit(n)
+    return deps
+
+
+def _failed(resp, data) -> str | None:
+    if getattr(resp, "isError", False):
+        return content_text(resp)[:200] or "tool error"
+    if isinstance(data, dict) and data.get("ok") is False:
+        return str(data.get("error", "ok=false"))
+    return None
+
+
+async def run_scenario(pool: SessionPool, scenario: Dict, sequential: bool = False) -> Dict:
+    steps = scenario["steps"]
+    deps = _check(steps)
+    default_peer = scenario.get("peer")
+    results: Dict[str, Any] = {}
+    report: Dict[str, Dict] = {}
+    t0 = time.perf_counter()
+
+    # sesiones primero (en paralelo): el tiempo de conexion no se mezcla con el de los pasos.
+    # Un peer inalcanzable solo hace fallar sus pasos (y los que dependen de ellos).
+    peers = list(dict.fromkeys(s.get("peer", default_peer) for s in steps))
+    conn = await asyncio.gather(*(pool.get(p) for p in peers), return_exceptions=True)
+    down = {p: f"connect: {type(e).__name__}: {e}" for p, e in zip(peers, conn) if isinstance(e, Exception)}
+    t_ready = time.perf_counter()
+
+    async def run_step(step: Dict, tasks: Dict[str, asyncio.Task]):
+        sid, peer = step["id"], step.get("peer", default_peer)
+        for d in deps[sid]:
+            await tasks[d]
+        bad = [d for d in deps[sid] if not report[d]["ok"]]
+        if bad:
+            report[sid] = {"id": sid, "peer": peer, "ok": False, "skipped": True,
+                           "error": f"depende de pasos fallidos: {bad}"}
+            return
+        if peer in down:
+            report[sid] = {"id": sid, "peer": peer, "tool": step.get("tool", "list_tools"),
+                           "ok": False, "error": down[peer]}
+            return
+        start = time.perf_counter()
+        rec = {"id": sid, "peer": peer, "tool": step.get("tool", "list_tools"),
+               "start_ms": round((start - t_ready) * 1000.0, 2)}
+        try:
+            # dentro del try: si la sesion murio y reconectar falla, solo falla este paso
+            session = await pool.get(peer)
+            if step.get("list_tools"):
+                tools = await session.list_tools()
+                data = [t.name for t in tools.tools]
+                err = None
+            else:
+                args = _resolve(step.get("args", {}), results)
+                coro = session.call_tool(step["tool"], args)
+                resp = await asyncio.wait_for(coro, step["timeout_s"]) if "timeout_s" in step else await coro
+                data = content_data(resp)
+                err = _failed(resp, data)
+            results[sid] = data
+            rec["ok"] = err is None
+            if err:
+                rec["error"] = err
+            rec["preview"] = json.dumps(data, ensure_ascii=False)[:120] if not isinstance(data, str) else data[:120]
+        except Exception as e:
+            rec["ok"], rec["error"] = False, f"{type(e).__name__}: {e}"
+        rec["ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+        report[sid] = rec
+
+    if sequential:
+        done: Dict[str, asyncio.Task] = {}
+        for step in steps:
+            # en orden de archivo, salvo que un paso dependa de otro posterior
+            for d in deps[step["id"]]:
+                if d not in done:
+                    raise ValueError(f"--sequential: '{step['id']}' depende de '{d}', declarado despues")
+            done[step["id"]] = asyncio.create_task(run_step(step, done))
+            await done[step["id"]]
+    else:
+        tasks: Dict[str, asyncio.Task] = {}
+        for step in steps:
+            tasks[step["id"]] = asyncio.create_task(run_step(step, tasks))
+        await asyncio.gather(*tasks.values())
+
+    end = time.perf_counter()
+    rows = [report[s["id"]] for s in steps]
+    return {
+        "scenario": scenario.get("name", "?"),
+        "ok": all(r["ok"] for r in rows),
+        "peers_down": sorted(down),
+        "connect_ms": round((t_ready - t0) * 1000.0, 2),
+        "steps_ms": round((end - t_ready) * 1000.0, 2),
+        "sum_step_ms": round(sum(r.get("ms", 0.0) for r in rows), 2),
+        "total_ms": round((end - t0) * 1000.0, 2),
+        "steps": rows,
+    }
+
+
+def load_scenarios(paths: List[str]) -> List[Dict]:
+    out = []
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        out.extend(doc if isinstance(doc, list) else [doc])
+    return out
+
+
+async def run_all(scenarios: List[Dict], peers: Dict[str, dict], repeat: int = 1,
+                  sequential: bool = False) -> List[Dict]:
+    reports = []
+    async with SessionPool(peers) as pool:
+        for i in range(repeat):
+            for sc in scenarios:
+                rep = await run_scenario(pool, sc, sequential)
+                rep["round"] = i
+                print(json.dumps({k: rep[k] for k in ("scenario", "round", "ok", "connect_ms",
+                                                      "steps_ms", "sum_step_ms", "total_ms")}))
+                reports.append(rep)
+    return reports
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ejecuta escenarios JSON de llamadas MCP contra peers")
+    ap.add_argument("files", nargs="+")
+    ap.add_argument("--peers", help="peers.json alternativo")
+    ap.add_argument("--repeat", type=int, default=1, help="rondas (las sesiones se reutilizan)")
+    ap.add_argument("--sequential", action="store_true", help="un paso tras otro (para comparar)")
+    ap.add_argument("--out", help="escribe el informe completo en este JSON")
+    a = ap.parse_args()
+
+    reports = asyncio.run(run_all(load_scenarios(a.files), load_peers(a.peers), a.repeat, a.sequential))
+    for rep in reports:
+        jdump({"type": "scenario", **rep})
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+    if not all(r["ok"] for r in reports):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 
 import os
 from .mcp_trivial_server import mcp  
+from .admission import install
+
+# Limites por cliente, carriles y cola acotada (ADMISSION=0 los desactiva); estado en GET /limits.
+ADMISSION = install(mcp)
 
 if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
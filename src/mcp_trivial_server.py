@@ -1,6 +1,7 @@
 
-import os, json
+import asyncio, os, json, base64, math, time, uuid
 from datetime import datetime, timezone
+import numpy as np
 from fastmcp import FastMCP
 from starlette.responses import PlainTextResponse
 from starlette.requests import Request
@@ -22,6 +23,118 @@ async def sum_numbers(numbers: list[float]) -> str:
     s = float(sum(numbers or []))
     return json.dumps({"sum": s}, ensure_ascii=False)
 
+# --- Arrays binarios ---
+# Buffers base64 de float64/float32 little-endian. np.frombuffer no copia los datos,
+# y las estadisticas se calculan vectorizadas en NumPy en vez de list[float] + sum().
+DTYPES = {"float64": np.dtype("<f8"), "float32": np.dtype("<f4")}
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+UPLOAD_TTL_S = float(os.getenv("UPLOAD_TTL_S", "300"))
+STATS_BLOCK = 1 << 16                   # elementos por bloque: el bloque en float64 cabe en cache
+STATS_THREAD_MIN = int(os.getenv("STATS_THREAD_MIN", str(1 << 20)))   # desde aqui, fuera del event loop
+
+_uploads: dict[str, dict] = {}
+
+def _decode(data_b64: str, dtype: str) -> np.ndarray:
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype no soportado: {dtype} (usa float64 o float32)")
+    raw = base64.b64decode(data_b64, validate=True)
+    if len(raw) % DTYPES[dtype].itemsize:
+        raise ValueError(f"buffer de {len(raw)} bytes no es multiplo de {DTYPES[dtype].itemsize}")
+    return np.frombuffer(raw, dtype=DTYPES[dtype])
+
+def _check_percentiles(percentiles: list[float] | None) -> str | None:
+    bad = [p for p in percentiles or [] if not (isinstance(p, (int, float)) and math.isfinite(p) and 0 <= p <= 100)]
+    return f"percentiles fuera de [0, 100]: {bad}" if bad else None
+
+def _stats(a: np.ndarray, percentiles: list[float] | None) -> dict:
+    n = int(a.size)
+    if n == 0:
+        return {"count": 0}
+    # Una pasada por bloques convertidos a float64 (tambien si la entrada es float32);
+    # la varianza de cada bloque se combina con la formula de Chan et al.
+    s, mean, m2, lo, hi, k = 0.0, 0.0, 0.0, math.inf, -math.inf, 0
+    for i in range(0, n, STATS_BLOCK):
+        b = a[i:i + STATS_BLOCK].astype(np.float64)
+        nb, sb = b.size, float(b.sum())
+        mb = sb / nb
+        d = b - mb
+        m2b = float(np.dot(d, d))
+        lo, hi = min(lo, float(b.min())), max(hi, float(b.max()))
+        delta, tot = mb - mean, k + nb
+        mean += delta * nb / tot
+        m2 += m2b + delta * delta * k * nb / tot
+        s, k = s + sb, tot
+    var = m2 / n
+    out = {"count": n, "sum": s, "mean": s / n, "min": lo, "max": hi,
+           "variance": var, "std": var ** 0.5}
+    if percentiles:
+        qs = np.percentile(a, percentiles)
+        out["percentiles"] = {str(p): float(q) for p, q in zip(percentiles, qs)}
+    return out
+
+async def _stats_json(a: np.ndarray, percentiles: list[float] | None) -> str:
+    # arrays grandes en un hilo: NumPy suelta el GIL y el resto de clientes sigue respondiendo
+    if a.size >= STATS_THREAD_MIN:
+        out = await asyncio.to_thread(_stats, a, percentiles)
+    else:
+        out = _stats(a, percentiles)
+    return json.dumps({"ok": True, **out}, ensure_ascii=False)
+
+def _expire_uploads():
+    now = time.monotonic()
+    for uid in [u for u, st in _uploads.items() if now - st["touched"] > UPLOAD_TTL_S]:
+        del _uploads[uid]
+
+@mcp.tool()
+async def array_stats(data_b64: str, dtype: str = "float64",
+                      percentiles: list[float] | None = None) -> str:
+    err = _check_percentiles(percentiles)
+    if err:
+        return json.dumps({"ok": False, "error": err}, ensure_ascii=False)
+    try:
+        a = _decode(data_b64, dtype)
+    except ValueError as e:
+        return json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False)
+    return await _stats_json(a, percentiles)
+
+@mcp.tool()
+async def array_begin(dtype: str = "float64") -> str:
+    # Envios por partes: array_begin -> array_append (N veces) -> array_finish
+    if dtype not in DTYPES:
+        return json.dumps({"ok": False, "error": f"dtype no soportado: {dtype}"}, ensure_ascii=False)
+    _expire_uploads()
+    uid = uuid.uuid4().hex
+    _uploads[uid] = {"dtype": dtype, "buf": bytearray(), "touched": time.monotonic()}
+    return json.dumps({"ok": True, "upload_id": uid}, ensure_ascii=False)
+
+@mcp.tool()
+async def array_append(upload_id: str, data_b64: str) -> str:
+    st = _uploads.get(upload_id)
+    if st is None:
+        return json.dumps({"ok": False, "error": "upload_id not found"}, ensure_ascii=False)
+    try:
+        chunk = _decode(data_b64, st["dtype"])
+    except ValueError as e:
+        return json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False)
+    if len(st["buf"]) + chunk.nbytes > MAX_UPLOAD_BYTES:
+        del _uploads[upload_id]
+        return json.dumps({"ok": False, "error": f"upload exceeds {MAX_UPLOAD_BYTES} bytes"}, ensure_ascii=False)
+    st["buf"] += chunk.data
+    st["touched"] = time.monotonic()
+    return json.dumps({"ok": True, "count": len(st["buf"]) // DTYPES[st["dtype"]].itemsize}, ensure_ascii=False)
+
+@mcp.tool()
+async def array_finish(upload_id: str, percentiles: list[float] | None = None) -> str:
+    # se valida antes de retirar el upload: con percentiles malos se puede reintentar
+    err = _check_percentiles(percentiles)
+    if err:
+        return json.dumps({"ok": False, "error": err}, ensure_ascii=False)
+    st = _uploads.pop(upload_id, None)
+    if st is None:
+        return json.dumps({"ok": False, "error": "upload_id not found"}, ensure_ascii=False)
+    a = np.frombuffer(st["buf"], dtype=DTYPES[st["dtype"]])
+    return await _stats_json(a, percentiles)
+
 @mcp.tool()
 async def time_now() -> str:
     # ISO-8601 en UTC
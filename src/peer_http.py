@@ -0,0 +1,92 @@
+import asyncio, os, threading
+from typing import Dict, Optional
+import httpx
+
+try:
+    import h2  # noqa: F401  (HTTP/2 es opcional: pip install "httpx[http2]")
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
+
+# Pool de clientes httpx compartido por los peers 'streamable-http'.
+# El chat usa asyncio.run por llamada, y un AsyncClient queda atado al loop donde abrio
+# sus conexiones; por eso los clientes viven en un loop propio en un hilo de fondo y las
+# llamadas se envian ahi. Asi las conexiones keep-alive (y el handshake TCP/TLS) se
+# reutilizan entre llamadas al mismo peer.
+
+CONNECT_TIMEOUT_S = float(os.getenv("PEER_HTTP_CONNECT_TIMEOUT_S", "5"))
+READ_TIMEOUT_S = float(os.getenv("PEER_HTTP_READ_TIMEOUT_S", "60"))
+MAX_CONNECTIONS = int(os.getenv("PEER_HTTP_MAX_CONNECTIONS", "20"))
+KEEPALIVE_S = float(os.getenv("PEER_HTTP_KEEPALIVE_S", "30"))
+HTTP2 = os.getenv("PEER_HTTP2", "0") == "1"
+
+
+class _Borrowed:
+    # el transporte de mcp hace 'async with factory(...) as client' y lo cierra al salir;
+    # con el cliente compartido, salir del contexto no debe cerrar el pool
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        return self.client
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class HttpPool:
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._clients: Dict[tuple, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="peer-http", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coro, timeout_s: float | None = None):
+        # ejecuta la corrutina en el loop del pool (bloquea al llamador hasta el resultado)
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result(timeout_s)
+
+    def client(self, cfg: dict) -> httpx.AsyncClient:
+        # un cliente por combinacion de opciones; peers con la misma config comparten conexiones
+        http2 = bool(cfg.get("http2", HTTP2))
+        if http2 and not HAS_H2:
+            raise ValueError("HTTP/2 requiere el paquete 'h2' (pip install \"httpx[http2]\")")
+        connect = float(cfg.get("connect_timeout_s", CONNECT_TIMEOUT_S))
+        read = float(cfg.get("read_timeout_s", READ_TIMEOUT_S))
+        key = (http2, connect, read)
+        c = self._clients.get(key)
+        if c is None:
+            c = httpx.AsyncClient(
+                http2=http2,
+                follow_redirects=True,
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                    max_keepalive_connections=MAX_CONNECTIONS,
+                                    keepalive_expiry=KEEPALIVE_S),
+            )
+            self._clients[key] = c
+        return c
+
+    def factory(self, cfg: dict):
+        # httpx_client_factory para streamablehttp_client (se llama dentro del loop del pool)
+        def _factory(headers=None, timeout=None, auth=None):
+            return _Borrowed(self.client(cfg))
+        return _factory
+
+    def close(self):
+        if self._loop is None:
+            return
+        async def _close():
+            for c in self._clients.values():
+                await c.aclose()
+            self._clients.clear()
+        self.run(_close())
+
+
+POOL = HttpPool()
@@ -0,0 +1,121 @@
+import json, os, threading, time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Literal, Optional
+from .log import jdump
+
+# Catalogo de carreras compartido por el servidor F1 y el chat.
+# Se carga del JSON la primera vez que se usa y se recarga solo si el archivo cambia.
+# Si la recarga falla (JSON a medio escribir, campos que faltan) se sigue con el indice anterior.
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / "data" / "races.json"
+
+
+@dataclass
+class Race:
+    race_id: str
+    season: int
+    name: str
+    laps: int
+    pit_loss_s: float
+    compounds: List[Literal["SOFT", "MEDIUM", "HARD"]]
+    circuit: str = ""
+
+
+@dataclass
+class _Index:
+    by_id: Dict[str, Race] = field(default_factory=dict)
+    by_season: Dict[int, List[Race]] = field(default_factory=dict)
+    by_circuit: Dict[str, List[Race]] = field(default_factory=dict)
+    aliases: Dict[str, str] = field(default_factory=dict)        # alias -> circuit
+    presets: Dict[str, Dict] = field(default_factory=dict)       # race_id -> parametros
+    mtime: float = 0.0
+
+
+def _build(path: Path) -> _Index:
+    with path.open("r", encoding="utf-8") as f:
+        doc = json.load(f)
+    circuits = doc.get("circuits", {})
+    idx = _Index(mtime=path.stat().st_mtime)
+    for cid, c in circuits.items():
+        for a in c.get("aliases", []):
+            idx.aliases[a.lower()] = cid
+    for r in doc.get("races", []):
+        race = Race(r["race_id"], int(r["season"]), r["name"], int(r["laps"]),
+                    float(r["pit_loss_s"]), list(r["compounds"]), r.get("circuit", ""))
+        idx.by_id[race.race_id] = race
+        idx.by_season.setdefault(race.season, []).append(race)
+        if race.circuit:
+            idx.by_circuit.setdefault(race.circuit, []).append(race)
+        preset = {**circuits.get(race.circuit, {}).get("preset", {}), **r.get("preset", {})}
+        if preset:
+            idx.presets[race.race_id] = preset
+    for races in idx.by_circuit.values():
+        races.sort(key=lambda x: x.season)
+    return idx
+
+
+class RaceCatalog:
+    def __init__(self, path: Path | str | None = None, check_interval_s: float = 1.0):
+        self.path = Path(path or os.getenv("F1_RACES_FILE") or DEFAULT_PATH)
+        self.check_interval_s = check_interval_s
+        self._idx: Optional[_Index] = None
+        self._checked = 0.0
+        self._bad_mtime: Optional[float] = None       # version del archivo que no se pudo cargar
+        self._lock = threading.Lock()
+
+    def _current(self) -> _Index:
+        # stat como mucho una vez por intervalo: las busquedas siguen siendo O(1)
+        now = time.monotonic()
+        if self._idx is None or now - self._checked >= self.check_interval_s:
+            with self._lock:
+                self._checked = now
+                try:
+                    mtime = self.path.stat().st_mtime
+                except OSError:
+                    mtime = None
+                if self._idx is None:
+                    self._idx = _build(self.path)
+                elif mtime is not None and mtime != self._idx.mtime and mtime != self._bad_mtime:
+                    try:
+                        self._idx = _build(self.path)
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        # se reintenta cuando vuelva a cambiar el archivo; se registra una vez por version
+                        self._bad_mtime = mtime
+                        jdump({"type": "race_catalog_error", "path": str(self.path),
+                               "error": f"{type(e).__name__}: {e}"})
+        return self._idx
+
+    def reload(self):
+        with self._lock:
+            self._idx = _build(self.path)
+            self._checked = time.monotonic()
+
+    def get(self, race_id: str) -> Optional[Race]:
+        return self._current().by_id.get(race_id)
+
+    def season(self, season: int) -> List[Race]:
+        return self._current().by_season.get(season, [])
+
+    def circuit(self, circuit: str) -> List[Race]:
+        return self._current().by_circuit.get(circuit, [])
+
+    def all(self) -> List[Race]:
+        return list(self._current().by_id.values())
+
+    def preset(self, race_id: str) -> Dict:
+        return dict(self._current().presets.get(race_id, {}))
+
+    def aliases(self) -> Dict[str, str]:
+        return self._current().aliases
+
+    def resolve_alias(self, alias: str, season: int | None = None) -> Optional[str]:
+        # alias de circuito -> race_id de esa temporada (o de la mas reciente)
+        idx = self._current()
+        races = idx.by_circuit.get(idx.aliases.get(alias.lower(), ""), [])
+        if season is not None:
+            races = [r for r in races if r.season == season]
+        return races[-1].race_id if races else None
+
+
+CATALOG = RaceCatalog()
@@ -0,0 +1,143 @@
+import argparse, json, sys, time
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from .log import LOG_FILE
+
+# Replay de interacciones grabadas (nl_dispatch / cmd_dispatch) contra servidores locales.
+#   python3 -m src.replay run --out base.jsonl            # con la version A del codigo
+#   python3 -m src.replay run --out cand.jsonl            # con la version B
+#   python3 -m src.replay compare base.jsonl cand.jsonl   # deltas de latencia y salidas distintas
+
+REPLAY_TYPES = ("nl_dispatch", "cmd_dispatch")
+
+
+def recorded(log: Path | None = None, since: str | None = None) -> Iterator[Dict]:
+    if since is not None:
+        # con LOG_SINK=segments solo se descomprimen los bloques de la ventana
+        from .log_segments import read_window
+        events = read_window(since)
+    else:
+        events = _jsonl(Path(log or LOG_FILE))
+    for ev in events:
+        if ev.get("type") in REPLAY_TYPES:
+            yield ev
+
+
+def _jsonl(path: Path) -> Iterator[Dict]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _same(a: str, b: str) -> bool:
+    # las salidas JSON se comparan por contenido (indentado vs compacto da igual)
+    try:
+        return json.loads(a) == json.loads(b)
+    except Exception:
+        return a.strip() == b.strip()
+
+
+class _PeerSkipped(Exception):
+    pass
+
+
+def _no_peers(alias, tool, args):
+    raise _PeerSkipped(alias)
+
+
+def run(events: Iterator[Dict], skip_peers: bool = False, limit: int | None = None) -> Iterator[Dict]:
+    from . import chat
+    chat.LAST_RACE_ID, chat.LAST_PLAN_ARGS = None, None
+    # skip_peers: cualquier peer_call (/peer y tambien comandos en lenguaje natural como
+    # "siguiente cancion") se corta antes de tocar el peer y la peticion no se reproduce
+    real_peer_call = chat.peer_call
+    if skip_peers:
+        chat.peer_call = _no_peers
+    try:
+        for i, ev in enumerate(events):
+            if limit is not None and i >= limit:
+                break
+            user = ev["input"]
+            if skip_peers and user.startswith("/peer"):
+                continue
+            t0 = time.perf_counter()
+            try:
+                out = chat.dispatch(user)
+                err = None
+            except _PeerSkipped:
+                continue
+            except Exception as e:
+                out, err = None, f"{type(e).__name__}: {e}"
+            latency_ms = (time.perf_counter() - t0) * 1000.0
+            out = chat.sanitize(out) if out is not None else ""
+            yield {"idx": i, "ts": ev.get("ts"), "input": user, "latency_ms": round(latency_ms, 3),
+                   "output": out, "error": err, "matches_recorded": err is None and _same(out, ev.get("output", ""))}
+    finally:
+        chat.peer_call = real_peer_call
+
+
+def compare(base: List[Dict], cand: List[Dict]) -> Dict:
+    by_key = {(r["idx"], r["input"]): r for r in base}
+    rows, deltas = [], []
+    for r in cand:
+        b = by_key.get((r["idx"], r["input"]))
+        if b is None:
+            continue
+        d = r["latency_ms"] - b["latency_ms"]
+        deltas.append(d)
+        rows.append({"idx": r["idx"], "input": r["input"][:80], "base_ms": b["latency_ms"],
+                     "cand_ms": r["latency_ms"], "delta_ms": round(d, 3),
+                     "same_output": _same(b["output"], r["output"])})
+    deltas.sort()
+    n = len(deltas)
+    return {
+        "requests": n,
+        "output_diffs": sum(1 for x in rows if not x["same_output"]),
+        "base_total_ms": round(sum(x["base_ms"] for x in rows), 3),
+        "cand_total_ms": round(sum(x["cand_ms"] for x in rows), 3),
+        "delta_p50_ms": round(deltas[n // 2], 3) if n else 0.0,
+        "delta_max_ms": round(deltas[-1], 3) if n else 0.0,
+        "rows": rows,
+    }
+
+
+def _read_jsonl(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay de interacciones grabadas del chat")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--log", help="JSONL de interacciones (por defecto logs/interactions.jsonl)")
+    r.add_argument("--since", help="ISO-8601: lee de los segmentos comprimidos desde ese instante")
+    r.add_argument("--limit", type=int)
+    r.add_argument("--skip-peers", action="store_true", help="omite las peticiones que llaman a peers (efectos reales)")
+    r.add_argument("--out", required=True)
+    c = sub.add_parser("compare")
+    c.add_argument("base")
+    c.add_argument("candidate")
+    c.add_argument("--rows", action="store_true", help="incluye el detalle por peticion")
+    a = ap.parse_args()
+
+    if a.cmd == "run":
+        total = mismatches = 0
+        with open(a.out, "w", encoding="utf-8") as f:
+            for row in run(recorded(a.log, a.since), a.skip_peers, a.limit):
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                total += 1
+                mismatches += not row["matches_recorded"]
+        print(json.dumps({"replayed": total, "differs_from_recorded": mismatches, "out": a.out}))
+    else:
+        rep = compare(_read_jsonl(a.base), _read_jsonl(a.candidate))
+        if not a.rows:
+            rep.pop("rows")
+        json.dump(rep, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+
+
+if __name__ == "__main__":
+    main()
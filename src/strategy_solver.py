@@ -0,0 +1,475 @@
+import heapq, itertools, time
+from dataclasses import replace
+from typing import Dict, Iterator, List
+
+from .race_catalog import Race
+
+# ----- Utilidades ----
+def stint_time_s(base_laptime_s: float, deg_per_lap_s: float, stint_laps: int) -> float:
+    L = stint_laps
+    return L * base_laptime_s + deg_per_lap_s * (L * (L - 1) / 2.0)
+
+def enumerate_splits(total_laps: int, min_stint: int, max_stint: int, max_stops: int) -> List[List[int]]:
+    plans: List[List[int]] = []
+    def rec(rem: int, cur: List[int], left: int):
+        if left == 1:
+            if min_stint <= rem <= max_stint: plans.append(cur + [rem])
+            return
+        for x in range(min_stint, max_stint + 1):
+            if x > rem: break
+            if rem - x < (left - 1) * min_stint: continue
+            if rem - x > (left - 1) * max_stint: continue
+            rec(rem - x, cur + [x], left - 1)
+    for k in range(1, max_stops + 2):
+        if k * min_stint <= total_laps <= k * max_stint:
+            rec(total_laps, [], k)
+    return plans
+
+def all_compound_sequences(comps: List[str], k: int) -> List[List[str]]:
+    if k == 0: return [[]]
+    res: List[List[str]] = []
+    def rec(cur: List[str]):
+        if len(cur) == k: res.append(cur[:]); return
+        for c in comps:
+            cur.append(c); rec(cur); cur.pop()
+    rec([])
+    return res
+
+def solve_strategy(
+    race: Race,
+    base_laptime_s: float,
+    deg_profile: Dict[str, float],
+    min_stint_laps: int,
+    max_stint_laps: int,
+    max_stops: int = 2,
+    enforce_two_compounds: bool = True
+) -> Dict:
+    best = None
+    splits = enumerate_splits(race.laps, min_stint_laps, max_stint_laps, max_stops)
+    cache: Dict[int, List[List[str]]] = {}
+    for plan in splits:
+        k = len(plan)
+        if k not in cache:
+            cache[k] = all_compound_sequences(race.compounds, k)
+        for seq in cache[k]:
+            # Regla de la FIA: si hay ≥2 stints, deben usarse ≥2 compuestos distintos (carrera seca)
+            if enforce_two_compounds and k >= 2 and len(set(seq)) < 2:
+                continue
+
+            total = 0.0
+            breakdown: List[float] = []
+            for laps, comp in zip(plan, seq):
+                stint = stint_time_s(base_laptime_s, deg_profile.get(comp, 0.0), laps)
+                breakdown.append(stint)
+                total += stint
+            total += (k - 1) * race.pit_loss_s
+
+            if (best is None) or (total < best[0]):
+                stops, acc = [], 0
+                for i in range(k - 1):
+                    acc += plan[i]
+                    stops.append(acc)
+                best = (total, plan, seq, stops, breakdown)
+
+    if best is None:
+        return {"ok": False, "error": "No feasible plan with given constraints."}
+
+    total, plan, seq, stops, bd = best
+    return _plan_result(race, base_laptime_s, deg_profile, total, plan, seq, stops, bd)
+
+def _plan_result(race: Race, base_laptime_s: float, deg_profile: Dict[str, float], total: float,
+                 plan: List[int], seq: List[str], stops: List[int], bd: List[float]) -> Dict:
+    return {
+        "ok": True,
+        "race_id": race.race_id,
+        "strategy": [f"{c}: {L}" for c, L in zip(seq, plan)],
+        "stop_laps": stops,
+        "predicted_total_s": round(total, 3),
+        "stint_breakdown_s": [round(x, 3) for x in bd],
+        "notes": f"{len(plan)-1} stop(s); pit_loss={race.pit_loss_s}s; base={base_laptime_s}s; deg={deg_profile}"
+    }
+
+def _stints_bound(rem: int, left: int, base_laptime_s: float, deg_min: float, max_stint_laps: int) -> float:
+    # Cota inferior del tiempo de 'left' stints que suman 'rem' vueltas, todos con el
+    # compuesto que menos degrada. Con deg_min >= 0 el desgaste L(L-1)/2 es convexo y el
+    # minimo es el reparto parejo. Con deg_min < 0 (pista que mejora) conviene lo contrario,
+    # stints largos: sum L(L-1)/2 <= rem*(max_stint_laps-1)/2 acota ese caso.
+    if deg_min < 0:
+        return rem * base_laptime_s + deg_min * rem * (max_stint_laps - 1) / 2.0
+    q, r = divmod(rem, left)
+    deg_laps = r * (q + 1) * q / 2.0 + (left - r) * q * (q - 1) / 2.0
+    return rem * base_laptime_s + deg_min * deg_laps
+
+def solve_strategy_anytime(
+    race: Race,
+    base_laptime_s: float,
+    deg_profile: Dict[str, float],
+    min_stint_laps: int,
+    max_stint_laps: int,
+    max_stops: int = 2,
+    enforce_two_compounds: bool = True,
+    deadline_s: float | None = None,
+    cancel=None,
+    deadline_at: float | None = None,
+) -> Dict:
+    """Branch & bound en profundidad: devuelve el mejor plan encontrado al vencer el deadline.
+
+    Recorrido DFS con pila; los hijos de cada nodo se visitan en orden de cota, asi que
+    se llega pronto a un plan completo y luego se poda con su tiempo. El orden de los
+    stints no cambia el tiempo total, asi que solo se exploran secuencias (vueltas,
+    compuesto) no decrecientes. 'deadline_at' es un instante de time.monotonic() (comun a
+    todos los procesos de la maquina), para contar desde que llego la peticion;
+    'deadline_s' es relativo al inicio de la busqueda. 'cancel' es un Event opcional.
+    """
+    t_end = deadline_at if deadline_at is not None else (
+        None if deadline_s is None else time.monotonic() + deadline_s)
+    comps = list(race.compounds)
+    deg = [deg_profile.get(c, 0.0) for c in comps]
+    deg_min = min(deg) if deg else 0.0
+    best_total, best = float("inf"), None
+
+    # Nodo: (f, g, stints restantes, vueltas restantes, plan, indices de compuesto)
+    stack: List[tuple] = []
+    for k in range(max_stops + 1, 0, -1):
+        if k * min_stint_laps <= race.laps <= k * max_stint_laps:
+            g = (k - 1) * race.pit_loss_s
+            stack.append((g + _stints_bound(race.laps, k, base_laptime_s, deg_min, max_stint_laps), g, k, race.laps, (), ()))
+    stack.sort(key=lambda n: -n[0])
+
+    nodes, aborted = 0, False
+    while stack:
+        nodes += 1
+        if nodes % 256 == 0 and ((t_end is not None and time.monotonic() >= t_end)
+                                 or (cancel is not None and cancel.is_set())):
+            aborted = True
+            break
+        f, g, left, rem, plan, seq = stack.pop()
+        if f >= best_total:
+            continue
+        if left == 0:
+            if enforce_two_compounds and len(plan) >= 2 and len(set(seq)) < 2:
+                continue
+            best_total, best = g, (plan, seq)
+            continue
+        prev_L = plan[-1] if plan else min_stint_laps
+        prev_c = seq[-1] if seq else 0
+        children = []
+        for L in range(max(prev_L, min_stint_laps), max_stint_laps + 1):
+            nrem = rem - L
+            if left == 1 and nrem != 0:
+                continue
+            # los stints restantes son >= L (orden no decreciente) y <= max_stint_laps
+            if nrem < (left - 1) * L or nrem > (left - 1) * max_stint_laps:
+                continue
+            for ci in range(prev_c if L == prev_L and plan else 0, len(comps)):
+                ng = g + stint_time_s(base_laptime_s, deg[ci], L)
+                h = _stints_bound(nrem, left - 1, base_laptime_s, deg_min, max_stint_laps) if left > 1 else 0.0
+                if ng + h < best_total:
+                    children.append((ng + h, ng, left - 1, nrem, plan + (L,), seq + (ci,)))
+        children.sort(key=lambda n: -n[0])
+        stack.extend(children)
+
+    if aborted:
+        lower = min([best_total] + [n[0] for n in stack])
+    else:
+        lower = best_total
+
+    if best is None:
+        if aborted:
+            return {"ok": False, "error": "no plan found before deadline", "exhaustive": False}
+        return {"ok": False, "error": "No feasible plan with given constraints.", "exhaustive": True}
+
+    plan, seq_idx = list(best[0]), [comps[i] for i in best[1]]
+    bd = [stint_time_s(base_laptime_s, deg_profile.get(c, 0.0), L) for L, c in zip(plan, seq_idx)]
+    stops = [sum(plan[:i + 1]) for i in range(len(plan) - 1)]
+    out = _plan_result(race, base_laptime_s, deg_profile, best_total, plan, seq_idx, stops, bd)
+    out["exhaustive"] = not aborted
+    out["optimality_gap_s"] = round(max(0.0, best_total - lower), 3)
+    out["nodes"] = nodes
+    return out
+
+
+# ----- Estrategia de equipo (dos coches) -----
+# Para cada coche, A* sobre secuencias ordenadas de stints genera los planes en orden
+# creciente de tiempo (la cota de _stints_bound es consistente). Los pares (i, j) se
+# recorren best-first por coste_A[i] + coste_B[j], materializando planes solo cuando hace
+# falta: el primer par compatible es optimo, sin cruzar los dos espacios completos.
+def iter_plans_by_cost(
+    race: Race,
+    base_laptime_s: float,
+    deg_profile: Dict[str, float],
+    min_stint_laps: int,
+    max_stint_laps: int,
+    max_stops: int = 2,
+    enforce_two_compounds: bool = True,
+) -> Iterator[tuple]:
+    """Genera (total, plan, compuestos, vueltas de parada) con total no decreciente."""
+    comps = list(race.compounds)
+    deg = [deg_profile.get(c, 0.0) for c in comps]
+    deg_min = min(deg) if deg else 0.0
+    heap: List[tuple] = []
+    tie = itertools.count()
+    for k in range(1, max_stops + 2):
+        if k * min_stint_laps <= race.laps <= k * max_stint_laps:
+            g = (k - 1) * race.pit_loss_s
+            heapq.heappush(heap, (g + _stints_bound(race.laps, k, base_laptime_s, deg_min, max_stint_laps),
+                                  next(tie), g, k, race.laps, (), ()))
+    while heap:
+        f, _, g, left, rem, plan, seq = heapq.heappop(heap)
+        if left == 0:
+            if enforce_two_compounds and len(plan) >= 2 and len(set(seq)) < 2:
+                continue
+            stops = tuple(itertools.accumulate(plan[:-1]))
+            yield g, plan, tuple(comps[i] for i in seq), stops
+            continue
+        for L in range(min_stint_laps, max_stint_laps + 1):
+            nrem = rem - L
+            if nrem < (left - 1) * min_stint_laps or nrem > (left - 1) * max_stint_laps:
+                continue
+            h = _stints_bound(nrem, left - 1, base_laptime_s, deg_min, max_stint_laps) if left > 1 else 0.0
+            for ci in range(len(comps)):
+                ng = g + stint_time_s(base_laptime_s, deg[ci], L)
+                heapq.heappush(heap, (ng + h, next(tie), ng, left - 1, nrem, plan + (L,), seq + (ci,)))
+
+def stop_conflicts(stops_a, stops_b, min_stop_separation: int) -> int:
+    return sum(1 for a in stops_a for b in stops_b if abs(a - b) < min_stop_separation)
+
+def solve_team_strategy(
+    race: Race,
+    car_a: Dict,
+    car_b: Dict,
+    min_stop_separation: int = 2,
+    stack_penalty_s: float | None = None,
+    enforce_two_compounds: bool = True,
+    max_pairs: int = 200_000,
+) -> Dict:
+    """Plan conjunto de dos coches sin paradas a menos de 'min_stop_separation' vueltas.
+
+    car_a/car_b: base_laptime_s, deg_soft_s, deg_medium_s, deg_hard_s, min_stint_laps,
+    max_stint_laps, max_stops. Sin stack_penalty_s los conflictos estan prohibidos; con
+    stack_penalty_s se permiten sumando esa penalizacion por cada par de paradas en conflicto.
+    """
+    def gen(car: Dict):
+        deg = {"SOFT": car["deg_soft_s"], "MEDIUM": car["deg_medium_s"], "HARD": car["deg_hard_s"]}
+        return iter_plans_by_cost(race, car["base_laptime_s"], deg, car["min_stint_laps"],
+                                  car["max_stint_laps"], car.get("max_stops", 2), enforce_two_compounds)
+
+    gens = [gen(car_a), gen(car_b)]
+    plans: List[List[tuple]] = [[], []]
+
+    def plan_at(car: int, i: int):
+        while len(plans[car]) <= i:
+            nxt = next(gens[car], None)
+            if nxt is None:
+                return None
+            plans[car].append(nxt)
+        return plans[car][i]
+
+    if plan_at(0, 0) is None or plan_at(1, 0) is None:
+        return {"ok": False, "error": "No feasible plan with given constraints."}
+
+    heap = [(plans[0][0][0] + plans[1][0][0], 0, 0)]
+    best_total, best = float("inf"), None
+    pairs = 0
+    while heap and pairs < max_pairs:
+        lb, i, j = heapq.heappop(heap)
+        if lb >= best_total:
+            break
+        pairs += 1
+        pa, pb = plans[0][i], plans[1][j]
+        conflicts = stop_conflicts(pa[3], pb[3], min_stop_separation)
+        if conflicts == 0 or stack_penalty_s is not None:
+            total = lb + conflicts * (stack_penalty_s or 0.0)
+            if total < best_total:
+                best_total, best = total, (pa, pb, conflicts)
+        # frontera de la matriz ordenada: (i, j+1) y, en la primera columna, (i+1, 0)
+        nb = plan_at(1, j + 1)
+        if nb is not None:
+            heapq.heappush(heap, (pa[0] + nb[0], i, j + 1))
+        if j == 0:
+            na = plan_at(0, i + 1)
+            if na is not None:
+                heapq.heappush(heap, (na[0] + pb[0], i + 1, 0))
+
+    if best is None:
+        if heap and pairs >= max_pairs:
+            return {"ok": False, "error": f"no compatible pair within {max_pairs} candidates"}
+        return {"ok": False, "error": "No compatible plans with given stop separation."}
+
+    pa, pb, conflicts = best
+    out = {"ok": True, "race_id": race.race_id,
+           "min_stop_separation": min_stop_separation,
+           "conflicts": conflicts,
+           "penalty_s": round(conflicts * (stack_penalty_s or 0.0), 3),
+           "team_total_s": round(best_total, 3),
+           "pairs_checked": pairs,
+           "exhaustive": not (heap and pairs >= max_pairs)}
+    for name, car, (total, plan, seq, stops) in (("car_a", car_a, pa), ("car_b", car_b, pb)):
+        deg = {"SOFT": car["deg_soft_s"], "MEDIUM": car["deg_medium_s"], "HARD": car["deg_hard_s"]}
+        bd = [stint_time_s(car["base_laptime_s"], deg[c], L) for L, c in zip(plan, seq)]
+        out[name] = _plan_result(race, car["base_laptime_s"], deg, total, list(plan), list(seq), list(stops), bd)
+    return out
+
+
+# ----- Sensibilidad -----
+# Con el plan fijo, el tiempo total es lineal en cada parametro:
+#   total = laps*base + sum_c deg_c * sum_{stints c} L(L-1)/2 + stops*pit_loss
+# asi que el optimo en funcion de un parametro es la envolvente inferior de rectas.
+# Se recorre con Eisner-Severance: resolver en los extremos, cortar las rectas de
+# ambos planes y volver a resolver solo en ese corte. Cuesta O(tramos) llamadas al solver.
+SENSITIVITY_PARAMS = ("deg_soft_s", "deg_medium_s", "deg_hard_s", "pit_loss_s", "base_laptime_s")
+_DEG_KEYS = {"deg_soft_s": "SOFT", "deg_medium_s": "MEDIUM", "deg_hard_s": "HARD"}
+
+def _plan_of(res: Dict) -> tuple:
+    stints = [s.split(": ") for s in res["strategy"]]
+    return tuple(int(L) for _, L in stints), tuple(c for c, _ in stints)
+
+def plan_total_s(race: Race, base_laptime_s: float, deg_profile: Dict[str, float],
+                 plan, seq) -> float:
+    return (sum(stint_time_s(base_laptime_s, deg_profile.get(c, 0.0), L) for L, c in zip(plan, seq))
+            + (len(plan) - 1) * race.pit_loss_s)
+
+def analyze_sensitivity(
+    race: Race,
+    base_laptime_s: float,
+    deg_profile: Dict[str, float],
+    min_stint_laps: int,
+    max_stint_laps: int,
+    max_stops: int = 2,
+    enforce_two_compounds: bool = True,
+    params: List[str] | None = None,
+    ranges: Dict[str, List[float]] | None = None,
+    max_solves: int = 400,
+) -> Dict:
+    params = list(params or SENSITIVITY_PARAMS)
+    bad = [p for p in params if p not in SENSITIVITY_PARAMS]
+    if bad:
+        return {"ok": False, "error": f"unknown parameters: {bad}"}
+    current = {**{k: deg_profile.get(c, 0.0) for k, c in _DEG_KEYS.items()},
+               "pit_loss_s": race.pit_loss_s, "base_laptime_s": base_laptime_s}
+    solves = 0
+
+    def setting(name: str, x: float):
+        deg = dict(deg_profile)
+        r, base = race, base_laptime_s
+        if name in _DEG_KEYS:
+            deg[_DEG_KEYS[name]] = x
+        elif name == "pit_loss_s":
+            r = replace(race, pit_loss_s=x)
+        else:
+            base = x
+        return r, base, deg
+
+    def solve_at(name: str, x: float):
+        nonlocal solves
+        solves += 1
+        r, base, deg = setting(name, x)
+        res = solve_strategy_anytime(r, base, deg, min_stint_laps, max_stint_laps, max_stops,
+                                     enforce_two_compounds)
+        return _plan_of(res) if res["ok"] else None
+
+    def line(name: str, p) -> tuple:
+        # (a, b) con total = a + b*x
+        a = plan_total_s(*setting(name, 0.0), *p)
+        return a, plan_total_s(*setting(name, 1.0), *p) - a
+
+    base_res = solve_strategy_anytime(race, base_laptime_s, deg_profile, min_stint_laps,
+                                      max_stint_laps, max_stops, enforce_two_compounds)
+    if not base_res["ok"]:
+        return base_res
+    optimal = _plan_of(base_res)
+    out_params: Dict[str, Dict] = {}
+
+    for name in params:
+        lo, hi = (ranges or {}).get(name) or _default_range(name, current[name])
+        pa, pb = solve_at(name, lo), solve_at(name, hi)
+        # breakpoints: lista de (x, plan_izq, plan_der)
+        breaks: List[tuple] = []
+
+        def envelope(xa, pa, xb, pb):
+            if pa is None or pb is None or solves >= max_solves:
+                return
+            la, lb = line(name, pa), line(name, pb)
+            if abs(la[1] - lb[1]) < 1e-12:
+                return                          # misma recta: mismo coste en todo el tramo
+            x = (lb[0] - la[0]) / (la[1] - lb[1])
+            tol = 1e-9 * max(1.0, abs(xa), abs(xb))
+            if x < xa - tol or x > xb + tol:
+                return
+            if x <= xa + tol or x >= xb - tol:
+                # corte en un extremo ya resuelto (empate en ese punto, habitual con planes
+                # simetricos): pa es optima en todo [xa, x] y pb en [x, xb]
+                breaks.append((min(max(x, xa), xb), pa, pb))
+                return
+            px = solve_at(name, x)
+            if px is None:
+                return
+            lx = line(name, px)
+            if lx[0] + lx[1] * x >= la[0] + la[1] * x - 1e-9:
+                breaks.append((x, pa, pb))      # nadie mejora el corte: es el break-even
+            else:
+                envelope(xa, pa, x, px)
+                envelope(x, px, xb, pb)
+
+        envelope(lo, pa, hi, pb)
+        breaks.sort(key=lambda b: b[0])
+        # empates de tres o mas planes en un mismo x: un solo corte; los cortes en lo/hi no
+        # delimitan ningun tramo, solo cambian el plan del tramo extremo
+        tol = 1e-9 * max(1.0, abs(lo), abs(hi))
+        merged: List[tuple] = []
+        for x, left, right in breaks:
+            if merged and x - merged[-1][0] <= tol:
+                merged[-1] = (merged[-1][0], merged[-1][1], right)
+            else:
+                merged.append((x, left, right))
+        breaks = [b for b in merged if b[1] != b[2]]
+        if breaks and breaks[0][0] - lo <= tol:
+            pa = breaks.pop(0)[2]
+        if breaks and hi - breaks[-1][0] <= tol:
+            breaks.pop()
+        segments, start, plan = [], lo, pa
+        for x, left, right in breaks:
+            segments.append({"from": round(start, 6), "to": round(x, 6), "strategy": _fmt(left)})
+            start, plan = x, right
+        segments.append({"from": round(start, 6), "to": round(hi, 6), "strategy": _fmt(plan)})
+
+        # intervalo donde el plan actual sigue siendo optimo (mismo coste que el actual)
+        l_opt = line(name, optimal)
+        stable = [lo, hi]
+        for x, left, right in breaks:
+            if x <= current[name] and _same_line(line(name, right), l_opt):
+                stable[0] = x
+            if x >= current[name] and _same_line(line(name, left), l_opt):
+                stable[1] = x
+                break
+        out_params[name] = {
+            "value": current[name],
+            "range": [lo, hi],
+            "stable_min": round(stable[0], 6),
+            "stable_max": round(stable[1], 6),
+            "break_even": [{"value": round(x, 6), "from": _fmt(a), "to": _fmt(b)} for x, a, b in breaks],
+            "segments": segments,
+        }
+
+    return {
+        "ok": True,
+        "race_id": race.race_id,
+        "strategy": base_res["strategy"],
+        "predicted_total_s": base_res["predicted_total_s"],
+        "parameters": out_params,
+        "solves": solves,
+        "complete": solves < max_solves,
+    }
+
+def _default_range(name: str, value: float) -> List[float]:
+    if name == "pit_loss_s":
+        return [0.0, max(60.0, 3 * value)]
+    if name == "base_laptime_s":
+        return [max(0.0, value - 10.0), value + 10.0]
+    return [min(0.0, 3 * value), max(0.5, 3 * value)]
+
+def _same_line(l1: tuple, l2: tuple) -> bool:
+    return abs(l1[0] - l2[0]) < 1e-6 and abs(l1[1] - l2[1]) < 1e-9
+
+def _fmt(p) -> List[str]:
+    return [f"{c}: {L}" for L, c in zip(*p)] if p else []
@@ -0,0 +1,153 @@
+import argparse, json, os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+
+from .race_catalog import CATALOG, Race
+from .strategy_solver import _plan_result, solve_strategy_anytime, stint_time_s
+
+# Tablas precalculadas de estrategia por carrera.
+#   tables/<race_id>.npy    uint16 [nS, nM, nH]: id del plan optimo en cada punto de la malla
+#   tables/<race_id>.json   ejes de la malla, restricciones usadas y lista de planes
+#
+# El tiempo base por vuelta suma laps * base a todos los planes, asi que no cambia cual es
+# el optimo: la malla solo cubre las degradaciones y base_laptime_s se aplica exacto al responder.
+# Dentro de una celda cuyas 8 esquinas coinciden en el plan, se responde con ese plan y su
+# tiempo (lineal en los parametros). Si las esquinas difieren (cerca de una frontera de
+# decision) o el punto cae fuera de la malla, se usa el solver en vivo.
+
+TABLE_DIR = Path(os.getenv("F1_TABLE_DIR", "tables"))
+DEG_AXIS = (0.0, 0.30, 31)       # min, max, puntos (paso 0.01 s/vuelta)
+COMPOUNDS = ("SOFT", "MEDIUM", "HARD")
+DEFAULT_LIMITS = {"min_stint_laps": 10, "max_stint_laps": 30, "max_stops": 2}
+
+
+def _limits(race: Race) -> Dict[str, int]:
+    p = CATALOG.preset(race.race_id)
+    return {k: int(p.get(k, v)) for k, v in DEFAULT_LIMITS.items()}
+
+
+def _solve_point(args) -> tuple:
+    race, limits, degs = args
+    res = solve_strategy_anytime(race, 0.0, dict(zip(COMPOUNDS, degs)), limits["min_stint_laps"],
+                                 limits["max_stint_laps"], limits["max_stops"], enforce_two_compounds=True)
+    if not res["ok"]:
+        return ()
+    return tuple(s for s in res["strategy"])
+
+
+def build_table(race: Race, out_dir: Path = TABLE_DIR, axis=DEG_AXIS, workers: int | None = None):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    limits = _limits(race)
+    grid = np.linspace(axis[0], axis[1], axis[2])
+    points = [(race, limits, (s, m, h)) for s in grid for m in grid for h in grid]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        results = list(ex.map(_solve_point, points, chunksize=256))
+    plans: List[tuple] = []
+    ids: Dict[tuple, int] = {}
+    table = np.empty(len(results), dtype=np.uint16)
+    for i, plan in enumerate(results):
+        if plan not in ids:
+            ids[plan] = len(plans)
+            plans.append(plan)
+        table[i] = ids[plan]
+    meta = {"race_id": race.race_id, "laps": race.laps, "pit_loss_s": race.pit_loss_s,
+            "compounds": list(race.compounds), "limits": limits, "axis": list(axis), "plans": [list(p) for p in plans]}
+    # un servidor en marcha tiene el .npy anterior mapeado en memoria: nunca se reescribe en
+    # sitio (SIGBUS o tabla a medias), se escribe aparte y se sustituye con os.replace.
+    # El .json va el ultimo: su mtime es la clave de cache de StrategyTables
+    npy, js = out_dir / f"{race.race_id}.npy", out_dir / f"{race.race_id}.json"
+    tmp_npy, tmp_js = (p.with_name(f".{p.name}.{os.getpid()}.part") for p in (npy, js))
+    try:
+        with open(tmp_npy, "wb") as f:
+            np.save(f, table.reshape(axis[2], axis[2], axis[2]))
+        tmp_js.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_npy, npy)
+        os.replace(tmp_js, js)
+    finally:
+        for t in (tmp_npy, tmp_js):
+            t.unlink(missing_ok=True)
+    return len(plans)
+
+
+class StrategyTables:
+    def __init__(self, directory: Path = TABLE_DIR):
+        self.dir = Path(directory)
+        self._tables: Dict[str, tuple] = {}
+
+    def _load(self, race_id: str):
+        # solo se cachean tablas existentes, por mtime: una tabla generada o regenerada
+        # despues de arrancar el servidor se usa sin reiniciar
+        meta_p = self.dir / f"{race_id}.json"
+        try:
+            mtime = meta_p.stat().st_mtime
+        except OSError:
+            self._tables.pop(race_id, None)
+            return None
+        cached = self._tables.get(race_id)
+        if cached is None or cached[0] != mtime:
+            meta = json.loads(meta_p.read_text(encoding="utf-8"))
+            table = np.load(self.dir / f"{race_id}.npy", mmap_mode="r")
+            # plan -> (vueltas, compuestos) ya parseado para no hacerlo en cada consulta
+            plans = []
+            for p in meta["plans"]:
+                seq = [s.split(": ") for s in p]
+                plans.append(([int(L) for _, L in seq], [c for c, _ in seq]))
+            cached = self._tables[race_id] = (mtime, (meta, table, plans))
+        return cached[1]
+
+    def lookup(self, race: Race, base_laptime_s: float, deg: Dict[str, float],
+               min_stint_laps: int, max_stint_laps: int, max_stops: int) -> Optional[Dict]:
+        entry = self._load(race.race_id)
+        if entry is None:
+            return None
+        meta, table, plans = entry
+        # la tabla solo vale para la carrera con la que se genero (tablas sin "compounds": regenerar)
+        if (meta["laps"] != race.laps or meta["pit_loss_s"] != race.pit_loss_s
+                or meta.get("compounds") != list(race.compounds)
+                or meta["limits"] != {"min_stint_laps": min_stint_laps, "max_stint_laps": max_stint_laps,
+                                      "max_stops": max_stops}):
+            return None
+        lo, hi, n = meta["axis"]
+        step = (hi - lo) / (n - 1)
+        cell = []
+        for c in COMPOUNDS:
+            x = (deg[c] - lo) / step
+            if x < 0 or x > n - 1:
+                return None
+            i = min(int(x), n - 2)
+            cell.append(i)
+        s, m, h = cell
+        corners = table[s:s + 2, m:m + 2, h:h + 2]
+        pid = int(corners[0, 0, 0])
+        if (corners != pid).any() or not plans[pid][0]:
+            return None
+        return _answer(race, base_laptime_s, deg, *plans[pid])
+
+
+def _answer(race: Race, base_laptime_s: float, deg: Dict[str, float],
+            plan: List[int], seq: List[str]) -> Dict:
+    bd = [stint_time_s(base_laptime_s, deg.get(c, 0.0), L) for L, c in zip(plan, seq)]
+    total = sum(bd) + (len(plan) - 1) * race.pit_loss_s
+    stops = [sum(plan[:i + 1]) for i in range(len(plan) - 1)]
+    out = _plan_result(race, base_laptime_s, deg, total, plan, seq, stops, bd)
+    out["source"] = "table"
+    return out
+
+
+if __name__ == "__main__":
+    # python -m src.strategy_tables [race_id ...]   (por defecto: todas las carreras)
+    ap = argparse.ArgumentParser(description="Precalcula tablas de estrategia por carrera")
+    ap.add_argument("race_ids", nargs="*")
+    ap.add_argument("--out", default=str(TABLE_DIR))
+    ap.add_argument("--points", type=int, default=DEG_AXIS[2], help="puntos por eje de degradacion")
+    ap.add_argument("--deg-max", type=float, default=DEG_AXIS[1])
+    ap.add_argument("--workers", type=int, default=None)
+    a = ap.parse_args()
+    races = [CATALOG.get(r) for r in a.race_ids] if a.race_ids else CATALOG.all()
+    for race in races:
+        if race is None:
+            continue
+        n = build_table(race, Path(a.out), (0.0, a.deg_max, a.points), a.workers)
+        print(f"{race.race_id}: {a.points}^3 puntos, {n} planes distintos")
@@ -0,0 +1,135 @@
+import asyncio, concurrent.futures, hashlib, os, re, threading, time
+from typing import Dict, List, Optional, Tuple
+from mcp.shared.exceptions import McpError
+from .log import jdump
+from .mcp_peers import SessionPool, content_text, f1_server_config, load_peers
+
+# Puente entre el LLM y las herramientas MCP.
+# Publica como tools de Anthropic las del servidor F1 y las de los peers de LLM_TOOL_PEERS
+# (nombre "<alias>__<tool>"). Cuando el modelo pide varias tool_use en un turno, se
+# ejecutan a la vez sobre sesiones abiertas una sola vez, y todos los resultados van en
+# un unico mensaje de vuelta.
+
+LLM_TOOL_PEERS = [p.strip() for p in os.getenv("LLM_TOOL_PEERS", "").split(",") if p.strip()]
+TOOL_TIMEOUT_S = float(os.getenv("LLM_TOOL_TIMEOUT_S", "60"))
+CONNECT_TIMEOUT_S = float(os.getenv("LLM_TOOL_CONNECT_TIMEOUT_S", "15"))   # abrir sesion + list_tools
+RETRY_S = float(os.getenv("LLM_TOOL_RETRY_S", "60"))       # reintento de peers que fallaron al listar
+RESULT_CHARS = int(os.getenv("LLM_TOOL_RESULT_CHARS", "8000"))      # recorte de cada resultado
+F1_ALIAS = "f1"
+NAME_OK = re.compile(r"[^a-zA-Z0-9_-]")
+
+
+class ToolBridge:
+    def __init__(self, peers: Optional[List[str]] = None):
+        self.aliases = [F1_ALIAS] + [p for p in (LLM_TOOL_PEERS if peers is None else peers) if p != F1_ALIAS]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool: Optional[SessionPool] = None
+        self._tools: Optional[List[Dict]] = None
+        self._retry_at = 0.0                                 # con peers caidos, cuando volver a listar
+        self._routes: Dict[str, Tuple[str, str]] = {}        # nombre para el LLM -> (alias, tool)
+        self._lock = threading.Lock()
+
+    def _run(self, coro, timeout_s: float | None = None):
+        # las sesiones viven en un loop propio en un hilo de fondo: el chat es sincrono
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="tool-bridge", daemon=True).start()
+        fut = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return fut.result(timeout_s)
+        except concurrent.futures.TimeoutError:     # en 3.10 no es el TimeoutError builtin
+            fut.cancel()
+            raise
+
+    async def _get_pool(self) -> SessionPool:
+        if self._pool is None:
+            peers = load_peers() if len(self.aliases) > 1 else {}
+            cfg = {a: peers[a] for a in self.aliases if a in peers}
+            cfg[F1_ALIAS] = f1_server_config()
+            self._pool = SessionPool(cfg)
+        return self._pool
+
+    async def _list(self) -> Tuple[List[Dict], bool]:
+        pool = await self._get_pool()
+
+        async def one(alias: str):
+            try:
+                session = await asyncio.wait_for(pool.get(alias), CONNECT_TIMEOUT_S)
+                return alias, (await asyncio.wait_for(session.list_tools(), CONNECT_TIMEOUT_S)).tools
+            except Exception as e:
+                # un peer caido no impide usar el resto
+                pool.evict(alias)
+                jdump({"type": "tool_bridge_error", "peer": alias, "error": f"{type(e).__name__}: {e}"})
+                return alias, None
+
+        out, routes, complete = [], {}, True
+        for alias, tools in await asyncio.gather(*(one(a) for a in self.aliases)):
+            complete &= tools is not None
+            for t in tools or []:
+                name = NAME_OK.sub("_", f"{alias}__{t.name}")[:64]
+                if name in routes:
+                    # el recorte a 64 o el saneado juntan dos herramientas: sufijo con hash
+                    digest = hashlib.sha1(f"{alias}/{t.name}".encode()).hexdigest()[:8]
+                    jdump({"type": "tool_bridge_error", "peer": alias,
+                           "error": f"nombre repetido '{name}' ({routes[name]} y {(alias, t.name)})"})
+                    name = f"{name[:55]}_{digest}"
+                routes[name] = (alias, t.name)
+                out.append({"name": name,
+                            "description": (t.description or t.name)[:1024],
+                            "input_schema": t.inputSchema or {"type": "object", "properties": {}}})
+        self._routes.update(routes)
+        return out, complete
+
+    def tools(self) -> List[Dict]:
+        # esquemas cacheados: list_tools una vez por proceso; si algun peer fallo, se
+        # vuelve a intentar pasados RETRY_S (mientras tanto, las herramientas que si hay)
+        if self._tools is None or (self._retry_at and time.monotonic() >= self._retry_at):
+            self._tools, complete = self._run(self._list(), CONNECT_TIMEOUT_S + 5.0)
+            self._retry_at = 0.0 if complete else time.monotonic() + RETRY_S
+        return self._tools
+
+    async def _call(self, use_id: str, name: str, args: Dict) -> Dict:
+        t0 = time.perf_counter()
+        route = self._routes.get(name)
+        try:
+            if route is None:
+                raise KeyError(f"tool desconocida: {name}")
+            pool = await self._get_pool()
+            try:
+                session = await asyncio.wait_for(pool.get(route[0]), CONNECT_TIMEOUT_S)
+                resp = await asyncio.wait_for(session.call_tool(route[1], args or {}), TOOL_TIMEOUT_S)
+            except McpError:
+                raise                       # error JSON-RPC: la sesion sigue viva
+            except Exception:
+                # sin conexion, transporte roto o peer colgado: la proxima llamada reconecta
+                pool.evict(route[0])
+                raise
+            text, is_error = content_text(resp), bool(getattr(resp, "isError", False))
+        except Exception as e:
+            text, is_error = f"{type(e).__name__}: {e}", True
+        jdump({"type": "tool_use", "tool": name, "args": args,
+               "ms": round((time.perf_counter() - t0) * 1000.0, 2), "is_error": is_error,
+               "result_preview": text[:160]})
+        if len(text) > RESULT_CHARS:
+            text = text[:RESULT_CHARS] + "\n...[recortado]"
+        return {"type": "tool_result", "tool_use_id": use_id, "content": text or "(sin salida)",
+                "is_error": is_error}
+
+    def call_many(self, uses: List[Tuple[str, str, Dict]]) -> List[Dict]:
+        # todas las tool_use del turno a la vez; el orden de los resultados es el de las peticiones
+        async def _all():
+            return list(await asyncio.gather(*(self._call(i, n, a) for i, n, a in uses)))
+        # cada llamada ya tiene su timeout; este es solo el tope del turno
+        return self._run(_all(), CONNECT_TIMEOUT_S + TOOL_TIMEOUT_S + 5.0)
+
+    def close(self):
+        if self._loop is None or self._pool is None:
+            return
+        try:
+            self._run(self._pool.__aexit__(None, None, None), CONNECT_TIMEOUT_S + 5.0)
+        except concurrent.futures.TimeoutError:
+            pass                        # al salir: el hilo del loop es daemon
+
+
+BRIDGE = ToolBridge()
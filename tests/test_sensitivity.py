@@ -0,0 +1,61 @@
+import random
+from dataclasses import replace
+
+import pytest
+
+from src.race_catalog import Race
+from src.strategy_solver import _DEG_KEYS, analyze_sensitivity, plan_total_s, solve_strategy
+
+# analyze_sensitivity contra re-resoluciones por fuerza bruta: en cada tramo devuelto, el plan
+# del tramo debe costar lo mismo que el optimo exacto en puntos interiores del tramo.
+
+
+def _setting(race, base, deg, name, x):
+    deg = dict(deg)
+    if name in _DEG_KEYS:
+        deg[_DEG_KEYS[name]] = x
+    elif name == "pit_loss_s":
+        race = replace(race, pit_loss_s=x)
+    else:
+        base = x
+    return race, base, deg
+
+
+def _plan(strategy):
+    stints = [s.split(": ") for s in strategy]
+    return tuple(int(L) for _, L in stints), tuple(c for c, _ in stints)
+
+
+def _check(race, base, deg, min_stint, max_stint, max_stops, params):
+    res = analyze_sensitivity(race, base, deg, min_stint, max_stint, max_stops, params=params)
+    assert res["ok"] and res["complete"]
+    for name, p in res["parameters"].items():
+        for seg in p["segments"]:
+            for t in (0.25, 0.5, 0.75):
+                x = seg["from"] + (seg["to"] - seg["from"]) * t
+                r, b, d = _setting(race, base, deg, name, x)
+                best = solve_strategy(r, b, d, min_stint, max_stint, max_stops)
+                got = plan_total_s(r, b, d, *_plan(seg["strategy"]))
+                assert got <= best["predicted_total_s"] + 1e-3, (name, x, seg["strategy"], best["strategy"])
+    return res
+
+
+def test_break_even_on_probe_endpoint():
+    # planes simetricos: el corte cae justo en un punto ya resuelto
+    race = Race("t", 2024, "t", 38, 20.108, ["SOFT", "MEDIUM", "HARD"])
+    deg = {"SOFT": 0.2996, "MEDIUM": 0.0603, "HARD": 0.0062}
+    res = _check(race, 80.0, deg, 9, 33, 1, ["deg_hard_s"])
+    values = [b["value"] for b in res["parameters"]["deg_hard_s"]["break_even"]]
+    assert any(abs(v - 0.028944) < 1e-6 for v in values)
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_segments_match_brute_force(seed):
+    rng = random.Random(seed)
+    laps = rng.randint(25, 45)
+    race = Race("t", 2024, "t", laps, round(rng.uniform(15, 25), 3), ["SOFT", "MEDIUM", "HARD"])
+    deg = {"SOFT": round(rng.uniform(0.1, 0.4), 4), "MEDIUM": round(rng.uniform(0.02, 0.12), 4),
+           "HARD": round(rng.uniform(0.0, 0.03), 4)}
+    min_stint = rng.randint(5, 10)
+    _check(race, 80.0, deg, min_stint, laps - min_stint, rng.randint(1, 2),
+           ["deg_soft_s", "deg_hard_s", "pit_loss_s"])